@@ -1,9 +1,15 @@
 """Ansible backend for complex installation operations."""
 
 import os
+import shutil
+import stat
 import tempfile
 import logging
-from typing import Dict, Any, Optional
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
 
 try:
     import ansible_runner
@@ -15,15 +21,89 @@ from core.exceptions import StepExecutionError
 
 logger = logging.getLogger(__name__)
 
+# Environment passed to every ansible-runner invocation. Pipelining needs
+# ``requiretty`` disabled in sudoers on the target hosts.
+_ANSIBLE_ENV = {
+    "ANSIBLE_PIPELINING": "True",
+    "ANSIBLE_SSH_PIPELINING": "True",
+    "ANSIBLE_FORKS": str((os.cpu_count() or 1) * 4),
+    "ANSIBLE_SSH_ARGS": "-o ControlMaster=auto -o ControlPersist=300s",
+}
+
+# File extensions recognised as playbooks
+PLAYBOOK_EXTENSIONS = ('.yml', '.yaml')
+
+# Seconds a resolved playbook path and its stat result are trusted
+RESOLVE_CACHE_TTL = 5.0
+
+# ansible-runner input dirs inside the private data dir. inventory/ is only
+# created when a run passes an inventory: if it exists, even empty,
+# ansible-runner uses it instead of the system default inventory.
+_SCRATCH_SUBDIRS = ("env", "project")
+
+# Per-run state cleared between runs; ansible-runner reads stale env/ and
+# inventory/ files as input, so they are reset together with artifacts/
+_SCRATCH_RUNTIME_DIRS = ("artifacts", "env", "inventory")
+
+# Seconds gathered facts stay valid in the fact cache
+FACT_CACHE_TIMEOUT = 7200
+
+# Default fact cache location, next to the transaction database
+FACT_CACHE_DIR = "/var/lib/transactional-installer/fact-cache"
+
+# Runner events counted per run, mapped to their counter name
+_COUNTED_EVENTS = {
+    "runner_on_ok": "ok",
+    "runner_on_failed": "failed",
+    "runner_on_skipped": "skipped",
+    "runner_on_unreachable": "unreachable",
+}
+
+# Output chunks of the most recent events kept for error reporting
+EVENT_TAIL_SIZE = 1000
+
+
+class _RunEvents:
+    """ansible-runner event handler keeping task counters and an output tail.
+
+    Events are consumed as they arrive, so memory stays flat however long
+    the playbook runs.
+    """
+
+    def __init__(self):
+        """Initialize empty counters and output tail."""
+        self.counts = dict.fromkeys(_COUNTED_EVENTS.values(), 0)
+        self.tail: deque = deque(maxlen=EVENT_TAIL_SIZE)
+
+    def __call__(self, event: Dict[str, Any]) -> bool:
+        """Record one event.
+
+        Args:
+            event: Event data delivered by ansible-runner
+
+        Returns:
+            Whether ansible-runner should write the event to its artifacts
+        """
+        name = event.get("event")
+        counter = _COUNTED_EVENTS.get(name)
+        if counter:
+            self.counts[counter] += 1
+        if event.get("stdout"):
+            self.tail.append(event["stdout"])
+        # Only the final stats event is persisted; Runner.stats reads it back
+        return name == "playbook_on_stats"
+
 
 class AnsibleBackend:
     """Backend for executing Ansible playbooks."""
 
-    def __init__(self, playbook_dir: str = "/etc/transactional-installer/ansible"):
+    def __init__(self, playbook_dir: str = "/etc/transactional-installer/ansible",
+                 fact_cache_dir: str = FACT_CACHE_DIR):
         """Initialize Ansible backend.
 
         Args:
             playbook_dir: Directory containing Ansible playbooks
+            fact_cache_dir: Private directory for the jsonfile fact cache
         """
         self.playbook_dir = playbook_dir
         
@@ -33,6 +113,27 @@ class AnsibleBackend:
         # Ensure playbook directory exists
         os.makedirs(playbook_dir, exist_ok=True)
 
+        # ansible-runner private data dir shared by all runs of this backend
+        self._private_data_dir = tempfile.mkdtemp(prefix="ti-ansible-")
+        self._finalizer = weakref.finalize(
+            self, shutil.rmtree, self._private_data_dir, ignore_errors=True
+        )
+        for subdir in _SCRATCH_SUBDIRS:
+            os.makedirs(os.path.join(self._private_data_dir, subdir), exist_ok=True)
+
+        # Cached playbook listing keyed by (dir mtime_ns, write generation)
+        self._playbook_generation = 0
+        self._playbook_list_cache: Optional[Tuple[Tuple[int, int], List[str]]] = None
+
+        # playbook argument -> (resolved path, stat, monotonic time checked)
+        self._resolve_cache: Dict[str, Tuple[str, os.stat_result, float]] = {}
+
+        # Runs share the private data dir, so only one may use it at a time
+        self._runner_lock = threading.Lock()
+
+        # Facts survive across runner invocations so each host is gathered once
+        self._fact_cache_dir = fact_cache_dir
+
     def run_playbook(self, playbook: str, vars_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Run an Ansible playbook.
 
@@ -50,42 +151,29 @@ class AnsibleBackend:
             raise StepExecutionError("ansible-runner not available")
 
         try:
-            logger.info(f"Running Ansible playbook: {playbook}")
+            logger.info("Running Ansible playbook: %s", playbook)
             
             # Resolve playbook path
-            playbook_path = self._resolve_playbook_path(playbook)
-            if not os.path.exists(playbook_path):
+            playbook_path, stat_info = self._locate_playbook(playbook)
+            if stat_info is None:
                 raise StepExecutionError(f"Playbook not found: {playbook_path}")
             
             # Prepare variables
             extra_vars = vars_data or {}
             
-            # Create temporary directory for Ansible artifacts
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Run the playbook
-                result = ansible_runner.run(
-                    playbook=playbook_path,
-                    extravars=extra_vars,
-                    private_data_dir=temp_dir,
-                    json_mode=True
-                )
-                
-                # Check execution result
-                if result.rc != 0:
-                    logger.error(f"Ansible playbook failed with rc={result.rc}")
-                    logger.error(f"Playbook output: {result.stdout.read() if result.stdout else 'No output'}")
-                    raise StepExecutionError(f"Ansible playbook failed with rc={result.rc}")
-                
-                return {
-                    "success": True,
-                    "playbook": playbook,
-                    "vars": extra_vars,
-                    "rc": result.rc,
-                    "stats": result.stats
-                }
+            result, events = self._run(playbook_path, extra_vars)
+            
+            return {
+                "success": True,
+                "playbook": playbook,
+                "vars": extra_vars,
+                "rc": result.rc,
+                "stats": result.stats,
+                "task_counts": events.counts
+            }
                 
         except Exception as e:
-            logger.error(f"Ansible playbook execution failed: {e}")
+            logger.error("Ansible playbook execution failed: %s", e)
             raise StepExecutionError(f"Ansible playbook execution failed: {e}")
 
     def run_playbook_with_inventory(self, playbook: str, inventory: str, 
@@ -107,46 +195,122 @@ class AnsibleBackend:
             raise StepExecutionError("ansible-runner not available")
 
         try:
-            logger.info(f"Running Ansible playbook with inventory: {playbook}")
+            logger.info("Running Ansible playbook with inventory: %s", playbook)
             
             # Resolve playbook path
-            playbook_path = self._resolve_playbook_path(playbook)
-            if not os.path.exists(playbook_path):
+            playbook_path, stat_info = self._locate_playbook(playbook)
+            if stat_info is None:
                 raise StepExecutionError(f"Playbook not found: {playbook_path}")
             
             # Prepare variables
             extra_vars = vars_data or {}
             
-            # Create temporary directory for Ansible artifacts
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Run the playbook with inventory
-                result = ansible_runner.run(
-                    playbook=playbook_path,
-                    inventory=inventory,
-                    extravars=extra_vars,
-                    private_data_dir=temp_dir,
-                    json_mode=True
-                )
-                
-                # Check execution result
-                if result.rc != 0:
-                    logger.error(f"Ansible playbook failed with rc={result.rc}")
-                    logger.error(f"Playbook output: {result.stdout.read() if result.stdout else 'No output'}")
-                    raise StepExecutionError(f"Ansible playbook failed with rc={result.rc}")
-                
-                return {
-                    "success": True,
-                    "playbook": playbook,
-                    "inventory": inventory,
-                    "vars": extra_vars,
-                    "rc": result.rc,
-                    "stats": result.stats
-                }
+            result, events = self._run(playbook_path, extra_vars, inventory=inventory)
+            
+            return {
+                "success": True,
+                "playbook": playbook,
+                "inventory": inventory,
+                "vars": extra_vars,
+                "rc": result.rc,
+                "stats": result.stats,
+                "task_counts": events.counts
+            }
                 
         except Exception as e:
-            logger.error(f"Ansible playbook execution failed: {e}")
+            logger.error("Ansible playbook execution failed: %s", e)
             raise StepExecutionError(f"Ansible playbook execution failed: {e}")
 
+    def _run(self, playbook_path: str, extra_vars: Dict[str, Any],
+             inventory: Optional[str] = None):
+        """Invoke ansible-runner in the shared private data dir.
+
+        Args:
+            playbook_path: Resolved playbook path
+            extra_vars: Extra variables for the run
+            inventory: Optional path to inventory file or inventory string
+
+        Returns:
+            ansible-runner result and the events collected during the run
+
+        Raises:
+            StepExecutionError: If the playbook exits with a non-zero rc
+        """
+        kwargs: Dict[str, Any] = {
+            "private_data_dir": self._private_data_dir,
+            "playbook": playbook_path,
+            "extravars": extra_vars,
+            "envvars": self._envvars(),
+        }
+        if inventory is not None:
+            kwargs["inventory"] = inventory
+
+        with self._runner_lock:
+            self._check_fact_cache_dir()
+            self._reset_scratch()
+
+            # Write inventory strings and env files the way ansible_runner.run
+            # does; values written to env/ are removed from kwargs
+            ansible_runner.utils.dump_artifacts(kwargs)
+
+            # prepare() derives the command, env and inventory from the
+            # per-run fields, so a config cannot be reused between runs
+            config = ansible_runner.RunnerConfig(**kwargs)
+            config.prepare()
+
+            events = _RunEvents()
+            result = ansible_runner.Runner(config=config, event_handler=events)
+            result.run()
+
+        # Check execution result
+        if result.rc != 0:
+            logger.error("Ansible playbook failed with rc=%s", result.rc)
+            if logger.isEnabledFor(logging.ERROR):
+                logger.error("Playbook output: %s", "\n".join(events.tail) or 'No output')
+            raise StepExecutionError(f"Ansible playbook failed with rc={result.rc}")
+
+        return result, events
+
+    def _reset_scratch(self) -> None:
+        """Drop per-run state left in the private data dir by the last run."""
+        for subdir in _SCRATCH_RUNTIME_DIRS:
+            path = os.path.join(self._private_data_dir, subdir)
+            shutil.rmtree(path, ignore_errors=True)
+            if subdir in _SCRATCH_SUBDIRS:
+                os.makedirs(path, exist_ok=True)
+
+    def _check_fact_cache_dir(self) -> None:
+        """Create the fact cache directory and make sure only we control it.
+
+        Playbooks trust cached facts, so a directory another user owns or
+        can write to is refused rather than used.
+
+        Raises:
+            StepExecutionError: If the directory is not private to this user
+        """
+        os.makedirs(self._fact_cache_dir, mode=0o700, exist_ok=True)
+        st = os.lstat(self._fact_cache_dir)
+        if (not stat.S_ISDIR(st.st_mode) or st.st_uid != os.geteuid()
+                or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+            raise StepExecutionError(
+                f"Refusing fact cache directory not private to uid {os.geteuid()}: "
+                f"{self._fact_cache_dir}"
+            )
+
+    def _envvars(self) -> Dict[str, str]:
+        """Build the environment for an ansible-runner invocation.
+
+        Returns:
+            Environment variables
+        """
+        return {
+            **_ANSIBLE_ENV,
+            "ANSIBLE_CACHE_PLUGIN": "jsonfile",
+            "ANSIBLE_CACHE_PLUGIN_CONNECTION": self._fact_cache_dir,
+            "ANSIBLE_CACHE_PLUGIN_TIMEOUT": str(FACT_CACHE_TIMEOUT),
+            "ANSIBLE_GATHERING": "smart",
+        }
+
     def validate_playbook(self, playbook: str) -> bool:
         """Validate an Ansible playbook.
 
@@ -157,41 +321,53 @@ class AnsibleBackend:
             True if playbook is valid
         """
         try:
-            playbook_path = self._resolve_playbook_path(playbook)
+            playbook_path, stat_info = self._locate_playbook(playbook)
             
-            if not os.path.exists(playbook_path):
-                logger.error(f"Playbook not found: {playbook_path}")
+            if stat_info is None:
+                logger.error("Playbook not found: %s", playbook_path)
                 return False
             
             # Basic YAML validation could be added here
             # For now, just check if file exists and is readable
-            with open(playbook_path, 'r') as f:
-                f.read()
+            if not os.access(playbook_path, os.R_OK):
+                logger.error("Playbook not readable: %s", playbook_path)
+                return False
             
             return True
             
         except Exception as e:
-            logger.error(f"Playbook validation failed: {e}")
+            logger.error("Playbook validation failed: %s", e)
             return False
 
     def list_playbooks(self) -> list:
         """List available playbooks.
 
+        The listing is cached until the playbook directory's mtime changes or
+        a playbook is created or deleted through this backend.
+
         Returns:
             List of available playbook paths
         """
-        playbooks = []
-        
         try:
-            if os.path.exists(self.playbook_dir):
-                for file in os.listdir(self.playbook_dir):
-                    if file.endswith('.yml') or file.endswith('.yaml'):
-                        playbooks.append(file)
-                        
+            key = (os.stat(self.playbook_dir).st_mtime_ns, self._playbook_generation)
+            if self._playbook_list_cache and self._playbook_list_cache[0] == key:
+                return list(self._playbook_list_cache[1])
+
+            with os.scandir(self.playbook_dir) as entries:
+                playbooks = [
+                    entry.name for entry in entries
+                    if entry.name.endswith(PLAYBOOK_EXTENSIONS)
+                    and entry.is_file()
+                ]
+
+            self._playbook_list_cache = (key, playbooks)
+            return list(playbooks)
+
+        except FileNotFoundError:
+            return []
         except Exception as e:
-            logger.error(f"Failed to list playbooks: {e}")
-            
-        return playbooks
+            logger.error("Failed to list playbooks: %s", e)
+            return []
 
     def create_playbook(self, name: str, content: str) -> str:
         """Create a new playbook file.
@@ -208,19 +384,21 @@ class AnsibleBackend:
         """
         try:
             # Ensure file has .yml extension
-            if not name.endswith('.yml') and not name.endswith('.yaml'):
+            if not name.endswith(PLAYBOOK_EXTENSIONS):
                 name += '.yml'
             
             playbook_path = os.path.join(self.playbook_dir, name)
             
             with open(playbook_path, 'w') as f:
                 f.write(content)
+            self._playbook_generation += 1
+            self._resolve_cache.clear()
             
-            logger.info(f"Created playbook: {playbook_path}")
+            logger.info("Created playbook: %s", playbook_path)
             return playbook_path
             
         except Exception as e:
-            logger.error(f"Failed to create playbook: {e}")
+            logger.error("Failed to create playbook: %s", e)
             raise StepExecutionError(f"Failed to create playbook: {e}")
 
     def _resolve_playbook_path(self, playbook: str) -> str:
@@ -239,6 +417,32 @@ class AnsibleBackend:
         # If it's a relative path, assume it's relative to playbook_dir
         return os.path.join(self.playbook_dir, playbook)
 
+    def _locate_playbook(self, playbook: str) -> Tuple[str, Optional[os.stat_result]]:
+        """Resolve a playbook path and stat it.
+
+        Found playbooks are cached for ``RESOLVE_CACHE_TTL`` seconds so a
+        run, validate and info sequence on the same playbook stats it once.
+        Misses are not cached, so a playbook is found as soon as it exists.
+
+        Args:
+            playbook: Playbook path or name
+
+        Returns:
+            Resolved playbook path and its stat result, or None if missing
+        """
+        now = time.monotonic()
+        cached = self._resolve_cache.get(playbook)
+        if cached and now - cached[2] < RESOLVE_CACHE_TTL:
+            return cached[0], cached[1]
+
+        playbook_path = self._resolve_playbook_path(playbook)
+        try:
+            stat_info = os.stat(playbook_path)
+        except FileNotFoundError:
+            return playbook_path, None
+        self._resolve_cache[playbook] = (playbook_path, stat_info, now)
+        return playbook_path, stat_info
+
     def get_playbook_info(self, playbook: str) -> Dict[str, Any]:
         """Get information about a playbook.
 
@@ -249,13 +453,11 @@ class AnsibleBackend:
             Playbook information
         """
         try:
-            playbook_path = self._resolve_playbook_path(playbook)
+            playbook_path, stat_info = self._locate_playbook(playbook)
             
-            if not os.path.exists(playbook_path):
+            if stat_info is None:
                 return {"error": "Playbook not found"}
             
-            stat_info = os.stat(playbook_path)
-            
             return {
                 "path": playbook_path,
                 "size": stat_info.st_size,
@@ -264,7 +466,7 @@ class AnsibleBackend:
             }
             
         except Exception as e:
-            logger.error(f"Failed to get playbook info: {e}")
+            logger.error("Failed to get playbook info: %s", e)
             return {"error": str(e)}
 
     def delete_playbook(self, playbook: str) -> bool:
@@ -277,16 +479,18 @@ class AnsibleBackend:
             True if deletion was successful
         """
         try:
-            playbook_path = self._resolve_playbook_path(playbook)
+            playbook_path, stat_info = self._locate_playbook(playbook)
             
-            if os.path.exists(playbook_path):
+            if stat_info is not None:
                 os.remove(playbook_path)
-                logger.info(f"Deleted playbook: {playbook_path}")
+                self._playbook_generation += 1
+                self._resolve_cache.clear()
+                logger.info("Deleted playbook: %s", playbook_path)
                 return True
             else:
-                logger.warning(f"Playbook not found: {playbook_path}")
+                logger.warning("Playbook not found: %s", playbook_path)
                 return False
                 
         except Exception as e:
-            logger.error(f"Failed to delete playbook: {e}")
+            logger.error("Failed to delete playbook: %s", e)
             return False 
\ No newline at end of file
@@ -1,10 +1,20 @@
 """Simple handlers for basic system operations."""
 
+import errno
+import fcntl
 import os
 import shutil
 import subprocess
 import logging
-from typing import List, Dict, Any
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional, Sequence, Set
+
+try:
+    import apt
+except ImportError:
+    apt = None
 
 from core.exceptions import StepExecutionError
 
@@ -12,12 +22,310 @@ from core.exceptions import StepExecutionError
 logger = logging.getLogger(__name__)
 
 
+# Directory whose mtime reflects the last successful ``apt-get update``
+APT_LISTS_DIR = "/var/lib/apt/lists/"
+
+# Package lists younger than this (in seconds) are not refreshed again
+APT_UPDATE_TTL = 300
+
+# Constant argv prefixes of the apt-get runs; package names are appended
+_APT_UPDATE = ("apt-get", "update")
+_APT_INSTALL = ("apt-get", "install", "-y")
+_APT_UPGRADE = ("apt-get", "upgrade", "-y")
+
+# Supported systemctl verbs and their log descriptions
+SERVICE_ACTIONS = {
+    "enable": "Enabling",
+    "disable": "Disabling",
+    "start": "Starting",
+    "stop": "Stopping",
+    "restart": "Restarting",
+}
+
+
+class PackageTransaction:
+    """Context manager that batches package operations into one apt run.
+
+    While the context is active, calls to ``install_packages``,
+    ``remove_packages`` and ``update_packages`` only queue their packages.
+    A package may be queued by only one of these operations per
+    transaction, since one apt run cannot keep their order. The queue is
+    flushed with a single apt invocation when the context
+    exits cleanly, and discarded if it exits with an exception.
+    """
+
+    def __init__(self, handlers: "SimpleHandlers"):
+        """Initialize package transaction.
+
+        Args:
+            handlers: Handlers whose package operations are batched
+        """
+        self.handlers = handlers
+
+    def __enter__(self) -> "SimpleHandlers":
+        self.handlers._batch_depth += 1
+        return self.handlers
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.handlers._batch_depth -= 1
+        if self.handlers._batch_depth:
+            return
+
+        if exc_type is None:
+            self.handlers.flush()
+        else:
+            self.handlers._clear_pending()
+
+
+# Per verb: (unit property, values meaning the verb is a no-op, value after it)
+_SERVICE_TARGETS = {
+    "enable": ("UnitFileState", frozenset({"enabled"}), "enabled"),
+    "disable": ("UnitFileState", frozenset({"disabled"}), "disabled"),
+    "start": ("ActiveState", frozenset({"active"}), "active"),
+    "stop": ("ActiveState", frozenset({"inactive"}), "inactive"),
+    "restart": ("ActiveState", frozenset(), "active"),
+}
+
+# Prebuilt (argv prefix, log description) per systemctl verb
+_SERVICE_COMMANDS = {
+    action: (("systemctl", action), description)
+    for action, description in SERVICE_ACTIONS.items()
+}
+
+
+# Trailing output lines kept from each stream of a command
+OUTPUT_TAIL_LINES = 50
+
+# Absolute paths of commands already found on PATH
+_EXECUTABLES: Dict[str, str] = {}
+
+
+def spawn_options(cmd: Sequence[str]) -> Dict[str, Any]:
+    """Build Popen options that let CPython spawn ``cmd`` via posix_spawn.
+
+    posix_spawn is only used for an absolute executable with
+    ``close_fds=False``. Keeping the descriptors open is safe here because
+    every descriptor Python creates is non-inheritable (PEP 446); only the
+    pipes set up for the child are passed on.
+
+    Args:
+        cmd: Command and arguments
+
+    Returns:
+        Keyword arguments for ``subprocess.Popen``/``subprocess.run``
+    """
+    name = cmd[0]
+    executable = _EXECUTABLES.get(name)
+    if executable is None:
+        # Misses are not cached so commands installed later are still found
+        executable = shutil.which(name)
+        if executable is not None:
+            _EXECUTABLES[name] = executable
+    return {"executable": executable, "close_fds": False}
+
+
+def _drain(stream, tail: deque, label: str) -> None:
+    """Consume a pipe line by line, keeping only its tail.
+
+    Args:
+        stream: Text pipe to read until EOF
+        tail: Bounded buffer receiving the lines
+        label: Stream name used in debug logging
+    """
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for line in stream:
+        tail.append(line)
+        if debug:
+            logger.debug("[%s] %s", label, line.rstrip())
+
+
+def run_command(cmd: Sequence[str],
+                env: Optional[Dict[str, str]] = None) -> subprocess.CompletedProcess:
+    """Run a command, streaming its output instead of buffering all of it.
+
+    Output is forwarded to the debug log line by line and only the last
+    ``OUTPUT_TAIL_LINES`` lines of each stream are kept, so memory stays flat
+    regardless of how much the command prints.
+
+    Args:
+        cmd: Command and arguments
+        env: Optional environment for the command
+
+    Returns:
+        Completed process with the output tails as ``stdout``/``stderr``
+
+    Raises:
+        subprocess.CalledProcessError: If the command exits non-zero
+    """
+    stdout_tail: deque = deque(maxlen=OUTPUT_TAIL_LINES)
+    stderr_tail: deque = deque(maxlen=OUTPUT_TAIL_LINES)
+
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, text=True, env=env,
+                          **spawn_options(cmd)) as proc:
+        stderr_reader = threading.Thread(
+            target=_drain, args=(proc.stderr, stderr_tail, "stderr"), daemon=True
+        )
+        stderr_reader.start()
+        _drain(proc.stdout, stdout_tail, "stdout")
+        stderr_reader.join()
+        returncode = proc.wait()
+
+    stdout, stderr = "".join(stdout_tail), "".join(stderr_tail)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+
+
+# errnos meaning "this copy syscall is not usable here", not a real I/O error
+_COPY_FALLBACK_ERRNOS = frozenset({
+    errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF
+})
+
+
+# ioctl cloning a whole file on reflink-capable filesystems (linux/fs.h)
+_FICLONE = 0x40049409
+
+# errnos of FICLONE on filesystems or file pairs that cannot be cloned
+_CLONE_FALLBACK_ERRNOS = _COPY_FALLBACK_ERRNOS | {errno.ENOTTY, errno.EPERM}
+
+
+def _clone(src_fd: int, dst_fd: int) -> bool:
+    """Share the source's extents with the destination via ``FICLONE``.
+
+    Args:
+        src_fd: Source file descriptor
+        dst_fd: Destination file descriptor
+
+    Returns:
+        False if the filesystem cannot clone the file
+    """
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+    except OSError as e:
+        if e.errno in _CLONE_FALLBACK_ERRNOS:
+            return False
+        raise
+    return True
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, chunk: int) -> bool:
+    """Copy a whole file in the kernel with ``copy_file_range(2)``.
+
+    Args:
+        src_fd: Source file descriptor
+        dst_fd: Destination file descriptor
+        chunk: Bytes to request per syscall
+
+    Returns:
+        False if the syscall is unavailable or copied nothing
+    """
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    copied = 0
+    while True:
+        try:
+            sent = os.copy_file_range(src_fd, dst_fd, chunk)
+        except OSError as e:
+            if copied == 0 and e.errno in _COPY_FALLBACK_ERRNOS:
+                return False
+            raise
+        if sent == 0:
+            # Some filesystems (procfs, sysfs, older FUSE/NFS) report EOF
+            # right away even for files with content, and may stat them as
+            # empty; let the caller fall back, which is cheap for empty files
+            return copied > 0
+        copied += sent
+
+
+def _sendfile(src_fd: int, dst_fd: int, chunk: int) -> bool:
+    """Copy a whole file in the kernel with ``sendfile(2)``.
+
+    Args:
+        src_fd: Source file descriptor
+        dst_fd: Destination file descriptor
+        chunk: Bytes to request per syscall
+
+    Returns:
+        False if the syscall is unavailable and nothing was copied
+    """
+    offset = 0
+    while True:
+        try:
+            sent = os.sendfile(dst_fd, src_fd, offset, chunk)
+        except OSError as e:
+            if offset == 0 and e.errno in _COPY_FALLBACK_ERRNOS:
+                return False
+            raise
+        if sent == 0:
+            return True
+        offset += sent
+
+
+def fast_copy(src: str, dest: str) -> str:
+    """Copy file data and metadata, keeping the data path in the kernel.
+
+    Tries a ``FICLONE`` reflink (Btrfs, XFS), then ``copy_file_range``,
+    then ``sendfile``, then a userspace ``copyfileobj`` loop. Metadata is
+    copied afterwards as ``shutil.copy2`` would.
+
+    Args:
+        src: Source file path
+        dest: Destination file or directory path
+
+    Returns:
+        Destination file path
+
+    Raises:
+        shutil.SameFileError: If source and destination are the same file
+    """
+    if os.path.isdir(dest):
+        dest = os.path.join(dest, os.path.basename(src))
+
+    # Opening dest truncates it, which would destroy src if they are one file
+    if os.path.exists(dest) and os.path.samefile(src, dest):
+        raise shutil.SameFileError(f"{src!r} and {dest!r} are the same file")
+
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        chunk = min(max(os.fstat(src_fd).st_size, 1 << 23), 1 << 30)
+        if not (_clone(src_fd, dst_fd)
+                or _copy_file_range(src_fd, dst_fd, chunk)
+                or _sendfile(src_fd, dst_fd, chunk)):
+            shutil.copyfileobj(fsrc, fdst)
+
+    shutil.copystat(src, dest)
+    return dest
+
+
 class SimpleHandlers:
     """Handlers for simple system operations."""
 
+    def __init__(self):
+        """Initialize simple handlers."""
+        self._pending_install: Set[str] = set()
+        self._pending_remove: Set[str] = set()
+        self._pending_update: Set[str] = set()
+        self._batch_depth = 0
+        self._apt_updated_at: Optional[float] = None
+        self._apt_cache = None
+        self._apt_cache_mtime: Optional[float] = None
+        self._ensured_dirs: Set[str] = set()
+
+    def package_transaction(self) -> PackageTransaction:
+        """Batch package operations until the returned context exits.
+
+        Returns:
+            Package transaction context manager
+        """
+        return PackageTransaction(self)
+
     def install_packages(self, packages: List[str]) -> Dict[str, Any]:
         """Install packages using apt.
 
+        Inside a package transaction the packages are only queued.
+
         Args:
             packages: List of package names to install
 
@@ -27,37 +335,17 @@ class SimpleHandlers:
         Raises:
             StepExecutionError: If installation fails
         """
-        try:
-            logger.info(f"Installing packages: {packages}")
-            
-            # Update package list first
-            subprocess.run(["apt-get", "update"], check=True, capture_output=True)
-            
-            # Install packages
-            result = subprocess.run(
-                ["apt-get", "install", "-y"] + packages,
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            
-            return {
-                "success": True,
-                "packages": packages,
-                "output": result.stdout,
-                "error": result.stderr
-            }
-            
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Package installation failed: {e}")
-            raise StepExecutionError(f"Package installation failed: {e.stderr}")
-        except Exception as e:
-            logger.error(f"Unexpected error during package installation: {e}")
-            raise StepExecutionError(f"Package installation failed: {e}")
+        logger.info("Installing packages: %s", packages)
+
+        self._queue(self._pending_install, packages)
+
+        return self._flush_unless_batching(packages)
 
     def remove_packages(self, packages: List[str]) -> Dict[str, Any]:
         """Remove packages using apt.
 
+        Inside a package transaction the packages are only queued.
+
         Args:
             packages: List of package names to remove
 
@@ -67,33 +355,17 @@ class SimpleHandlers:
         Raises:
             StepExecutionError: If removal fails
         """
-        try:
-            logger.info(f"Removing packages: {packages}")
-            
-            result = subprocess.run(
-                ["apt-get", "remove", "-y"] + packages,
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            
-            return {
-                "success": True,
-                "packages": packages,
-                "output": result.stdout,
-                "error": result.stderr
-            }
-            
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Package removal failed: {e}")
-            raise StepExecutionError(f"Package removal failed: {e.stderr}")
-        except Exception as e:
-            logger.error(f"Unexpected error during package removal: {e}")
-            raise StepExecutionError(f"Package removal failed: {e}")
+        logger.info("Removing packages: %s", packages)
+
+        self._queue(self._pending_remove, packages)
+
+        return self._flush_unless_batching(packages)
 
     def update_packages(self, packages: List[str]) -> Dict[str, Any]:
         """Update packages using apt.
 
+        Inside a package transaction the packages are only queued.
+
         Args:
             packages: List of package names to update
 
@@ -103,33 +375,206 @@ class SimpleHandlers:
         Raises:
             StepExecutionError: If update fails
         """
+        logger.info("Updating packages: %s", packages)
+
+        self._queue(self._pending_update, packages)
+
+        return self._flush_unless_batching(packages)
+
+    def flush(self) -> Dict[str, Any]:
+        """Apply all queued package operations.
+
+        With python-apt available, all operations are marked on the
+        in-process cache and applied with a single commit. Otherwise installs
+        and removals are merged into a single ``apt-get install`` call
+        (removals use apt's ``pkg-`` suffix) and upgrades into a single
+        ``apt-get upgrade`` call. Package lists are refreshed at most once.
+
+        Returns:
+            Combined result of the queued operations
+
+        Raises:
+            StepExecutionError: If the apt run fails
+        """
+        install = sorted(self._pending_install)
+        remove = sorted(self._pending_remove)
+        update = sorted(self._pending_update)
+        self._clear_pending()
+
+        result = {
+            "success": True,
+            "installed": install,
+            "removed": remove,
+            "updated": update,
+            "output": "",
+            "error": ""
+        }
+
+        if not (install or remove or update):
+            return result
+
         try:
-            logger.info(f"Updating packages: {packages}")
-            
-            # Update package list first
-            subprocess.run(["apt-get", "update"], check=True, capture_output=True)
-            
-            # Update packages
-            result = subprocess.run(
-                ["apt-get", "upgrade", "-y"] + packages,
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            
-            return {
-                "success": True,
-                "packages": packages,
-                "output": result.stdout,
-                "error": result.stderr
-            }
-            
+            if apt:
+                self._commit_apt_cache(install, remove, update)
+                return result
+
+            if install or update:
+                self._apt_update()
+
+            commands = []
+            if install or remove:
+                commands.append(
+                    _APT_INSTALL + tuple(install) + tuple(f"{p}-" for p in remove)
+                )
+            if update:
+                commands.append(_APT_UPGRADE + tuple(update))
+
+            for cmd in commands:
+                proc = run_command(cmd, env=self._apt_env())
+                result["output"] += proc.stdout
+                result["error"] += proc.stderr
+
+            return result
+
         except subprocess.CalledProcessError as e:
-            logger.error(f"Package update failed: {e}")
-            raise StepExecutionError(f"Package update failed: {e.stderr}")
+            logger.error("Package operation failed: %s", e)
+            raise StepExecutionError(f"Package operation failed: {e.stderr}")
+        except KeyError as e:
+            logger.error("Unknown package: %s", e)
+            raise StepExecutionError(f"Package operation failed: unknown package {e}")
         except Exception as e:
-            logger.error(f"Unexpected error during package update: {e}")
-            raise StepExecutionError(f"Package update failed: {e}")
+            if apt and isinstance(e, apt.cache.LockFailedException):
+                logger.error("Package manager is locked: %s", e)
+                raise StepExecutionError(f"Package manager is locked: {e}")
+            logger.error("Unexpected error during package operation: %s", e)
+            raise StepExecutionError(f"Package operation failed: {e}")
+
+    def _commit_apt_cache(self, install: List[str], remove: List[str],
+                          update: List[str]) -> None:
+        """Apply package operations in-process through python-apt.
+
+        Args:
+            install: Packages to install
+            remove: Packages to remove
+            update: Packages to upgrade
+        """
+        if install or update:
+            self._apt_update()
+
+        cache = self._get_apt_cache()
+
+        try:
+            for name in install:
+                cache[name].mark_install()
+            for name in update:
+                if cache[name].is_upgradable:
+                    cache[name].mark_upgrade()
+            for name in remove:
+                if cache[name].is_installed:
+                    cache[name].mark_delete(purge=False)
+
+            if cache.get_changes():
+                cache.commit()
+        except Exception:
+            # Marks of the failed run must not be committed by a later flush
+            self._apt_cache = None
+            raise
+        finally:
+            # dpkg status changed (or marks are left over); reopen lazily
+            self._apt_cache_mtime = None
+
+    def _get_apt_cache(self):
+        """Get the python-apt cache, reopening it if the package index changed.
+
+        Returns:
+            Open ``apt.Cache`` instance
+        """
+        try:
+            mtime = os.path.getmtime(APT_LISTS_DIR)
+        except OSError:
+            mtime = None
+
+        if self._apt_cache is None:
+            self._apt_cache = apt.Cache()
+            self._apt_cache_mtime = mtime
+        elif mtime is None or mtime != self._apt_cache_mtime:
+            self._apt_cache.open(None)
+            self._apt_cache_mtime = mtime
+
+        return self._apt_cache
+
+    def _queue(self, queue: Set[str], packages: List[str]) -> None:
+        """Queue packages for one operation of the current transaction.
+
+        Args:
+            queue: Pending set of the operation
+            packages: Packages to add to it
+
+        Raises:
+            StepExecutionError: If a package is already queued for another
+                operation
+        """
+        for other in (self._pending_install, self._pending_remove, self._pending_update):
+            conflicts = other.intersection(packages) if other is not queue else None
+            if conflicts:
+                raise StepExecutionError(
+                    f"Packages already queued for another operation: {sorted(conflicts)}"
+                )
+        queue.update(packages)
+
+    def _flush_unless_batching(self, packages: List[str]) -> Dict[str, Any]:
+        """Flush queued package operations unless a transaction is active.
+
+        Args:
+            packages: Packages of the operation that triggered the flush
+
+        Returns:
+            Operation result
+        """
+        if self._batch_depth:
+            return {"success": True, "packages": packages, "queued": True}
+
+        result = self.flush()
+        result["packages"] = packages
+        return result
+
+    def _clear_pending(self) -> None:
+        """Drop all queued package operations."""
+        self._pending_install.clear()
+        self._pending_remove.clear()
+        self._pending_update.clear()
+
+    def _apt_update(self) -> None:
+        """Refresh package lists unless they are younger than the TTL.
+
+        Raises:
+            subprocess.CalledProcessError: If ``apt-get update`` fails
+        """
+        now = time.time()
+        if self._apt_updated_at and now - self._apt_updated_at < APT_UPDATE_TTL:
+            return
+
+        try:
+            if now - os.path.getmtime(APT_LISTS_DIR) < APT_UPDATE_TTL:
+                self._apt_updated_at = now
+                return
+        except OSError:
+            pass
+
+        if apt:
+            self._get_apt_cache().update()
+        else:
+            run_command(_APT_UPDATE, env=self._apt_env())
+        self._apt_updated_at = time.time()
+
+    @staticmethod
+    def _apt_env() -> Dict[str, str]:
+        """Build the environment for non-interactive apt runs.
+
+        Returns:
+            Environment variables
+        """
+        return dict(os.environ, DEBIAN_FRONTEND="noninteractive")
 
     def copy_file(self, src: str, dest: str) -> Dict[str, Any]:
         """Copy a file from source to destination.
@@ -145,15 +590,16 @@ class SimpleHandlers:
             StepExecutionError: If copy fails
         """
         try:
-            logger.info(f"Copying file from {src} to {dest}")
+            logger.info("Copying file from %s to %s", src, dest)
             
-            # Ensure destination directory exists
+            # Ensure destination directory exists, once per directory
             dest_dir = os.path.dirname(dest)
-            if dest_dir:
+            if dest_dir and dest_dir not in self._ensured_dirs:
                 os.makedirs(dest_dir, exist_ok=True)
+                self._ensured_dirs.add(dest_dir)
             
             # Copy file
-            shutil.copy2(src, dest)
+            fast_copy(src, dest)
             
             return {
                 "success": True,
@@ -162,9 +608,15 @@ class SimpleHandlers:
             }
             
         except Exception as e:
-            logger.error(f"File copy failed: {e}")
+            # The directory may have been removed behind our back
+            self._ensured_dirs.discard(os.path.dirname(dest))
+            logger.error("File copy failed: %s", e)
             raise StepExecutionError(f"File copy failed: {e}")
 
+    def clear_caches(self) -> None:
+        """Forget cached filesystem state, e.g. at a transaction boundary."""
+        self._ensured_dirs.clear()
+
     def remove_file(self, file_path: str) -> Dict[str, Any]:
         """Remove a file.
 
@@ -178,7 +630,7 @@ class SimpleHandlers:
             StepExecutionError: If removal fails
         """
         try:
-            logger.info(f"Removing file: {file_path}")
+            logger.info("Removing file: %s", file_path)
             
             if os.path.exists(file_path):
                 os.remove(file_path)
@@ -196,7 +648,7 @@ class SimpleHandlers:
                 }
             
         except Exception as e:
-            logger.error(f"File removal failed: {e}")
+            logger.error("File removal failed: %s", e)
             raise StepExecutionError(f"File removal failed: {e}")
 
     def enable_service(self, service_name: str) -> Dict[str, Any]:
@@ -211,30 +663,7 @@ class SimpleHandlers:
         Raises:
             StepExecutionError: If enable fails
         """
-        try:
-            logger.info(f"Enabling service: {service_name}")
-            
-            result = subprocess.run(
-                ["systemctl", "enable", service_name],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            
-            return {
-                "success": True,
-                "service": service_name,
-                "action": "enable",
-                "output": result.stdout,
-                "error": result.stderr
-            }
-            
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Service enable failed: {e}")
-            raise StepExecutionError(f"Service enable failed: {e.stderr}")
-        except Exception as e:
-            logger.error(f"Unexpected error during service enable: {e}")
-            raise StepExecutionError(f"Service enable failed: {e}")
+        return self._service_action("enable", service_name)
 
     def disable_service(self, service_name: str) -> Dict[str, Any]:
         """Disable a systemd service.
@@ -248,30 +677,7 @@ class SimpleHandlers:
         Raises:
             StepExecutionError: If disable fails
         """
-        try:
-            logger.info(f"Disabling service: {service_name}")
-            
-            result = subprocess.run(
-                ["systemctl", "disable", service_name],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            
-            return {
-                "success": True,
-                "service": service_name,
-                "action": "disable",
-                "output": result.stdout,
-                "error": result.stderr
-            }
-            
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Service disable failed: {e}")
-            raise StepExecutionError(f"Service disable failed: {e.stderr}")
-        except Exception as e:
-            logger.error(f"Unexpected error during service disable: {e}")
-            raise StepExecutionError(f"Service disable failed: {e}")
+        return self._service_action("disable", service_name)
 
     def start_service(self, service_name: str) -> Dict[str, Any]:
         """Start a systemd service.
@@ -285,30 +691,7 @@ class SimpleHandlers:
         Raises:
             StepExecutionError: If start fails
         """
-        try:
-            logger.info(f"Starting service: {service_name}")
-            
-            result = subprocess.run(
-                ["systemctl", "start", service_name],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            
-            return {
-                "success": True,
-                "service": service_name,
-                "action": "start",
-                "output": result.stdout,
-                "error": result.stderr
-            }
-            
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Service start failed: {e}")
-            raise StepExecutionError(f"Service start failed: {e.stderr}")
-        except Exception as e:
-            logger.error(f"Unexpected error during service start: {e}")
-            raise StepExecutionError(f"Service start failed: {e}")
+        return self._service_action("start", service_name)
 
     def stop_service(self, service_name: str) -> Dict[str, Any]:
         """Stop a systemd service.
@@ -322,30 +705,7 @@ class SimpleHandlers:
         Raises:
             StepExecutionError: If stop fails
         """
-        try:
-            logger.info(f"Stopping service: {service_name}")
-            
-            result = subprocess.run(
-                ["systemctl", "stop", service_name],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            
-            return {
-                "success": True,
-                "service": service_name,
-                "action": "stop",
-                "output": result.stdout,
-                "error": result.stderr
-            }
-            
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Service stop failed: {e}")
-            raise StepExecutionError(f"Service stop failed: {e.stderr}")
-        except Exception as e:
-            logger.error(f"Unexpected error during service stop: {e}")
-            raise StepExecutionError(f"Service stop failed: {e}")
+        return self._service_action("stop", service_name)
 
     def restart_service(self, service_name: str) -> Dict[str, Any]:
         """Restart a systemd service.
@@ -359,30 +719,112 @@ class SimpleHandlers:
         Raises:
             StepExecutionError: If restart fails
         """
+        return self._service_action("restart", service_name)
+
+    def query_service_state(self, service_names: List[str]) -> Dict[str, Dict[str, str]]:
+        """Get ActiveState/UnitFileState of units with one ``systemctl show`` call.
+
+        State is queried on every call, never cached: package scripts,
+        custom scripts and playbooks may start or enable units at any time.
+
+        Args:
+            service_names: Names of the services
+
+        Returns:
+            Mapping of service name to its known properties (empty if unknown)
+        """
+        states: Dict[str, Dict[str, str]] = {name: {} for name in service_names}
         try:
-            logger.info(f"Restarting service: {service_name}")
-            
+            # Output is a few lines per unit, so it is captured directly
+            cmd = ["systemctl", "show", "-p", "ActiveState,UnitFileState", *service_names]
             result = subprocess.run(
-                ["systemctl", "restart", service_name],
+                cmd,
                 check=True,
                 capture_output=True,
-                text=True
+                text=True,
+                **spawn_options(cmd)
             )
-            
-            return {
-                "success": True,
-                "service": service_name,
-                "action": "restart",
-                "output": result.stdout,
-                "error": result.stderr
-            }
-            
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.warning("Failed to query service state: %s", e)
+        else:
+            # One blank-line separated block per unit, in argument order
+            for name, block in zip(service_names, result.stdout.split("\n\n")):
+                states[name] = dict(
+                    line.split("=", 1) for line in block.splitlines() if "=" in line
+                )
+
+        return states
+
+    def _systemctl(self, action: str, service_names: List[str]) -> Dict[str, Any]:
+        """Apply one ``systemctl`` verb to several units at once.
+
+        Units already in the target state are skipped without calling
+        ``systemctl``.
+
+        Args:
+            action: systemctl verb (enable, disable, start, stop, restart)
+            service_names: Names of the services
+
+        Returns:
+            Action result, with already-correct units listed in ``skipped``
+
+        Raises:
+            StepExecutionError: If the action fails
+        """
+        argv_prefix, description = _SERVICE_COMMANDS[action]
+        prop, noop_values, new_value = _SERVICE_TARGETS[action]
+
+        skipped = []
+        if noop_values:
+            states = self.query_service_state(service_names)
+            skipped = [name for name in service_names if states[name].get(prop) in noop_values]
+        pending = [name for name in service_names if name not in skipped]
+
+        result = {
+            "success": True,
+            "services": service_names,
+            "action": action,
+            "skipped": skipped,
+            "output": "",
+            "error": ""
+        }
+        if not pending:
+            logger.info("Services already %s: %s", new_value, service_names)
+            return result
+
+        try:
+            logger.info("%s services: %s", description, pending)
+
+            proc = run_command([*argv_prefix, *pending])
+
+            result["output"] = proc.stdout
+            result["error"] = proc.stderr
+            return result
+
         except subprocess.CalledProcessError as e:
-            logger.error(f"Service restart failed: {e}")
-            raise StepExecutionError(f"Service restart failed: {e.stderr}")
+            logger.error("Service %s failed: %s", action, e)
+            raise StepExecutionError(f"Service {action} failed: {e.stderr}")
         except Exception as e:
-            logger.error(f"Unexpected error during service restart: {e}")
-            raise StepExecutionError(f"Service restart failed: {e}")
+            logger.error("Unexpected error during service %s: %s", action, e)
+            raise StepExecutionError(f"Service {action} failed: {e}")
+
+    def _service_action(self, action: str, service_name: str) -> Dict[str, Any]:
+        """Apply one ``systemctl`` verb to a single unit.
+
+        Args:
+            action: systemctl verb
+            service_name: Name of the service
+
+        Returns:
+            Action result keyed by ``service``
+
+        Raises:
+            StepExecutionError: If the action fails
+        """
+        result = self._systemctl(action, [service_name])
+        result["service"] = result.pop("services")[0]
+        result["skipped"] = bool(result["skipped"])
+        return result
 
     def create_user(self, username: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a system user.
@@ -398,10 +840,10 @@ class SimpleHandlers:
             StepExecutionError: If creation fails
         """
         try:
-            logger.info(f"Creating user: {username}")
-            
+            logger.info("Creating user: %s", username)
+
             cmd = ["useradd"]
-            
+
             # Add user options based on user_data
             if user_data.get("home"):
                 cmd.extend(["-d", user_data["home"]])
@@ -411,11 +853,11 @@ class SimpleHandlers:
                 cmd.extend(["-G", ",".join(user_data["groups"])])
             if user_data.get("system"):
                 cmd.append("-r")
-            
+
             cmd.append(username)
-            
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-            
+
+            result = run_command(cmd)
+
             return {
                 "success": True,
                 "username": username,
@@ -423,12 +865,12 @@ class SimpleHandlers:
                 "output": result.stdout,
                 "error": result.stderr
             }
-            
+
         except subprocess.CalledProcessError as e:
-            logger.error(f"User creation failed: {e}")
+            logger.error("User creation failed: %s", e)
             raise StepExecutionError(f"User creation failed: {e.stderr}")
         except Exception as e:
-            logger.error(f"Unexpected error during user creation: {e}")
+            logger.error("Unexpected error during user creation: %s", e)
             raise StepExecutionError(f"User creation failed: {e}")
 
     def remove_user(self, username: str) -> Dict[str, Any]:
@@ -444,14 +886,9 @@ class SimpleHandlers:
             StepExecutionError: If removal fails
         """
         try:
-            logger.info(f"Removing user: {username}")
+            logger.info("Removing user: %s", username)
             
-            result = subprocess.run(
-                ["userdel", "-r", username],
-                check=True,
-                capture_output=True,
-                text=True
-            )
+            result = run_command(["userdel", "-r", username])
             
             return {
                 "success": True,
@@ -462,10 +899,10 @@ class SimpleHandlers:
             }
             
         except subprocess.CalledProcessError as e:
-            logger.error(f"User removal failed: {e}")
+            logger.error("User removal failed: %s", e)
             raise StepExecutionError(f"User removal failed: {e.stderr}")
         except Exception as e:
-            logger.error(f"Unexpected error during user removal: {e}")
+            logger.error("Unexpected error during user removal: %s", e)
             raise StepExecutionError(f"User removal failed: {e}")
 
     def modify_user(self, username: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -482,7 +919,7 @@ class SimpleHandlers:
             StepExecutionError: If modification fails
         """
         try:
-            logger.info(f"Modifying user: {username}")
+            logger.info("Modifying user: %s", username)
             
             cmd = ["usermod"]
             
@@ -496,7 +933,7 @@ class SimpleHandlers:
             
             cmd.append(username)
             
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+            result = run_command(cmd)
             
             return {
                 "success": True,
@@ -507,8 +944,8 @@ class SimpleHandlers:
             }
             
         except subprocess.CalledProcessError as e:
-            logger.error(f"User modification failed: {e}")
+            logger.error("User modification failed: %s", e)
             raise StepExecutionError(f"User modification failed: {e.stderr}")
         except Exception as e:
-            logger.error(f"Unexpected error during user modification: {e}")
+            logger.error("Unexpected error during user modification: %s", e)
             raise StepExecutionError(f"User modification failed: {e}") 
\ No newline at end of file
@@ -2,25 +2,78 @@
 
 import logging
 import subprocess
+import shlex
 import shutil
 import os
-from typing import Dict, Any
-from .simple_handlers import SimpleHandlers
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Callable, Optional, Set
+from .simple_handlers import SimpleHandlers, run_command
+from core.exceptions import StepExecutionError
 
 logger = logging.getLogger(__name__)
 
+# Called with (index, step) before a step in a dependency graph runs; a true
+# return value skips the step
+BeforeStepCallback = Callable[[int, Dict[str, Any]], Optional[bool]]
+
+# Called with (index, step, error or None) after a step in a dependency graph ran
+AfterStepCallback = Callable[[int, Dict[str, Any], Optional[Exception]], None]
+
+
+def step_runs(steps: List[Dict[str, Any]]) -> List[List[int]]:
+    """Split steps into runs that can be executed together.
+
+    Consecutive ``apt_package`` steps share a run as long as no package
+    appears in two of its steps; a step touching a package already in the
+    run starts a new one, so "remove X" then "install X" keep their order.
+    Every other step is a run of its own.
+
+    Args:
+        steps: Step configurations in execution order
+
+    Returns:
+        Indexes of the steps in each run, in execution order
+    """
+    runs: List[List[int]] = []
+    run_packages: Optional[Set[str]] = None
+    for index, step in enumerate(steps):
+        if step.get("type") != "apt_package":
+            runs.append([index])
+            run_packages = None
+            continue
+
+        packages = set(step.get("packages") or ())
+        if run_packages is None or not run_packages.isdisjoint(packages):
+            runs.append([])
+            run_packages = set()
+        runs[-1].append(index)
+        run_packages |= packages
+    return runs
+
 
 class StepExecutor:
     """Executes different types of installation steps."""
 
+    # Step type -> name of the method executing it
+    STEP_HANDLERS = {
+        "apt_package": "_execute_apt_package",
+        "file_copy": "_execute_file_copy",
+        "custom_script": "_execute_custom_script",
+    }
+
+    # Apt action -> (SimpleHandlers method, progress verb, result verb)
+    APT_ACTIONS = {
+        "install": ("install_packages", "Installing", "Installed"),
+        "remove": ("remove_packages", "Removing", "Removed"),
+        "update": ("update_packages", "Updating", "Updated"),
+    }
+
     def __init__(self):
         """Initialize step executor."""
         self.simple_handlers = SimpleHandlers()
-        self.step_handlers = {
-            "apt_package": self._execute_apt_package,
-            "file_copy": self._execute_file_copy,
-            "custom_script": self._execute_custom_script,
-        }
+        # Serializes apt steps run from a dependency graph (dpkg lock)
+        self._apt_lock = threading.Lock()
 
     def execute_step(self, step: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a single step.
@@ -36,18 +89,167 @@ class StepExecutor:
         """
         step_type = step.get("type")
         
-        if step_type not in self.step_handlers:
+        handler_name = self.STEP_HANDLERS.get(step_type)
+        if handler_name is None:
             raise Exception(f"Unknown step type: {step_type}")
         
         try:
-            logger.info(f"Executing step: {step_type}")
-            result = self.step_handlers[step_type](step)
-            logger.info(f"Successfully executed step: {step_type}")
+            logger.info("Executing step: %s", step_type)
+            result = getattr(self, handler_name)(step)
+            logger.info("Successfully executed step: %s", step_type)
             return result
         except Exception as e:
-            logger.error(f"Failed to execute step {step_type}: {e}")
+            logger.error("Failed to execute step %s: %s", step_type, e)
             raise
 
+    def execute_steps(self, steps: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """Execute a list of steps, coalescing adjacent apt steps.
+
+        Steps are split with ``step_runs``: consecutive ``apt_package`` steps
+        touching disjoint package sets are queued in one package transaction
+        and applied with a single apt run, whatever their actions. Every
+        other step, and a lone apt step, is dispatched through
+        ``execute_step``.
+
+        Args:
+            steps: Step configurations in execution order
+
+        Returns:
+            Execution result of each step, keyed by its index in ``steps``
+
+        Raises:
+            Exception: If a step execution fails
+        """
+        results: Dict[int, Dict[str, Any]] = {}
+
+        for run in step_runs(steps):
+            if len(run) > 1:
+                run_results = self._execute_apt_group([steps[index] for index in run])
+                results.update(zip(run, run_results))
+            else:
+                results[run[0]] = self.execute_step(steps[run[0]])
+
+        return results
+
+    def execute_dag(self, steps: List[Dict[str, Any]],
+                    before_step: Optional[BeforeStepCallback] = None,
+                    after_step: Optional[AfterStepCallback] = None) -> Dict[int, Dict[str, Any]]:
+        """Execute steps concurrently according to their dependencies.
+
+        A step may set ``id`` and list the ids of earlier steps it needs in
+        ``depends_on``. A step without ``depends_on`` depends on the step
+        before it, so plain step lists keep their sequential order. Steps
+        whose dependencies have completed run in parallel, except apt steps,
+        which never overlap each other. After the first failure no new steps
+        are started. The callbacks run in the worker threads, so callbacks
+        of independent steps may run concurrently.
+
+        Args:
+            steps: Step configurations in declaration order
+            before_step: Optional callback run before each step starts; if
+                it returns True the step and its ``after_step`` are skipped
+            after_step: Optional callback run after each step finishes
+
+        Returns:
+            Execution result of each step, keyed by its index in ``steps``
+
+        Raises:
+            Exception: If a dependency is invalid or a step execution fails
+        """
+        dependents: List[List[int]] = [[] for _ in steps]
+        remaining: List[int] = []
+        ids: Dict[str, int] = {}
+
+        for index, step in enumerate(steps):
+            if "depends_on" in step:
+                predecessors: Set[int] = set()
+                for step_id in step["depends_on"]:
+                    if step_id not in ids:
+                        raise Exception(
+                            f"Step {index} depends on unknown or later step: {step_id}"
+                        )
+                    predecessors.add(ids[step_id])
+            else:
+                predecessors = {index - 1} if index else set()
+
+            for predecessor in predecessors:
+                dependents[predecessor].append(index)
+            remaining.append(len(predecessors))
+
+            if "id" in step:
+                ids[step["id"]] = index
+
+        results: Dict[int, Dict[str, Any]] = {}
+        error: Optional[Exception] = None
+        if not steps:
+            return results
+
+        # Steps mostly wait on subprocesses, so use more workers than CPUs
+        max_workers = min(len(steps), (os.cpu_count() or 1) * 2)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running = {}
+
+            def submit(index: int) -> None:
+                future = executor.submit(
+                    self._execute_dag_step, index, steps[index], before_step, after_step
+                )
+                running[future] = index
+
+            for index, count in enumerate(remaining):
+                if not count:
+                    submit(index)
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                        continue
+
+                    results[index] = future.result()
+                    if error is None:
+                        for dependent in dependents[index]:
+                            remaining[dependent] -= 1
+                            if not remaining[dependent]:
+                                submit(dependent)
+
+        if error is not None:
+            raise error
+        return results
+
+    def _execute_dag_step(self, index: int, step: Dict[str, Any],
+                          before_step: Optional[BeforeStepCallback],
+                          after_step: Optional[AfterStepCallback]) -> Dict[str, Any]:
+        """Execute one step of a dependency graph with its callbacks.
+
+        Args:
+            index: Index of the step in the graph
+            step: Step configuration
+            before_step: Optional callback run before the step starts
+            after_step: Optional callback run after the step finishes
+
+        Returns:
+            Execution result
+        """
+        if before_step and before_step(index, step):
+            return {"success": True, "skipped": True}
+
+        try:
+            if step.get("type") == "apt_package":
+                with self._apt_lock:
+                    result = self.execute_step(step)
+            else:
+                result = self.execute_step(step)
+        except Exception as e:
+            if after_step:
+                after_step(index, step, e)
+            raise
+
+        if after_step:
+            after_step(index, step, None)
+        return result
+
     def _execute_apt_package(self, step: Dict[str, Any]) -> Dict[str, Any]:
         """Execute apt package installation/removal.
 
@@ -57,31 +259,44 @@ class StepExecutor:
         Returns:
             Execution result
         """
-        action = step.get("action")
-        packages = step.get("packages", [])
-        
-        if not packages:
-            raise Exception("No packages specified for apt_package step")
-        
-        if action == "install":
-            logger.info(f"Installing packages: {packages}")
-            # Here you would call the actual package installation logic
-            # For now, we'll just log the action
-            return {
-                "success": True,
-                "message": f"Installed packages: {packages}",
-                "packages": packages
-            }
-        elif action == "remove":
-            logger.info(f"Removing packages: {packages}")
-            # Here you would call the actual package removal logic
-            return {
+        return self._execute_apt_group([step])[0]
+
+    def _execute_apt_group(self, steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Execute apt steps with a single apt invocation.
+
+        Every step is checked before any is queued, then all are queued in
+        one package transaction that is applied when it exits.
+
+        Args:
+            steps: Apt package step configurations
+
+        Returns:
+            Execution result of each step
+        """
+        apt_actions = []
+        for step in steps:
+            if not step.get("packages"):
+                raise Exception("No packages specified for apt_package step")
+
+            action = step.get("action")
+            if action not in self.APT_ACTIONS:
+                raise Exception(f"Unknown apt action: {action}")
+            apt_actions.append(self.APT_ACTIONS[action])
+
+        with self.simple_handlers.package_transaction():
+            for step, (handler_name, progress, _) in zip(steps, apt_actions):
+                logger.info("%s packages: %s", progress, step["packages"])
+                getattr(self.simple_handlers, handler_name)(step["packages"])
+
+        # Only reached once the transaction has been applied
+        return [
+            {
                 "success": True,
-                "message": f"Removed packages: {packages}",
-                "packages": packages
+                "message": f"{verb} packages: {step['packages']}",
+                "packages": step["packages"]
             }
-        else:
-            raise Exception(f"Unknown apt action: {action}")
+            for step, (_, _, verb) in zip(steps, apt_actions)
+        ]
 
     def _execute_file_copy(self, step: Dict[str, Any]) -> Dict[str, Any]:
         """Execute file copy operation.
@@ -98,10 +313,11 @@ class StepExecutor:
         if not src or not dest:
             raise Exception("Source and destination must be specified for file_copy step")
         
-        logger.info(f"Copying file from {src} to {dest}")
+        logger.info("Copying file from %s to %s", src, dest)
+        
+        # Data is copied in the kernel (copy_file_range/sendfile), see fast_copy
+        self.simple_handlers.copy_file(src, dest)
         
-        # Here you would implement the actual file copy logic
-        # For now, we'll just log the action
         return {
             "success": True,
             "message": f"Copied file from {src} to {dest}",
@@ -112,21 +328,38 @@ class StepExecutor:
     def _execute_custom_script(self, step: Dict[str, Any]) -> Dict[str, Any]:
         """Execute custom script.
 
+        ``script`` is a command line (split like a shell would, but run
+        without one) or an argument list.
+
         Args:
             step: Custom script step configuration
 
         Returns:
             Execution result
+
+        Raises:
+            StepExecutionError: If the script cannot be run or exits non-zero
         """
         script = step.get("script")
         
         if not script:
             raise Exception("Script must be specified for custom_script step")
         
-        logger.info(f"Executing custom script: {script}")
+        logger.info("Executing custom script: %s", script)
+        
+        # Run the script directly rather than through /bin/sh
+        argv = shlex.split(script) if isinstance(script, str) else [str(arg) for arg in script]
+        if os.path.isfile(argv[0]):
+            argv[0] = os.path.abspath(argv[0])
+        
+        try:
+            run_command(argv)
+        except (subprocess.CalledProcessError, OSError) as e:
+            stderr = getattr(e, "stderr", None)
+            raise StepExecutionError(
+                f"Custom script failed: {e}" + (f": {stderr.strip()}" if stderr else "")
+            )
         
-        # Here you would implement the actual script execution logic
-        # For now, we'll just log the action
         return {
             "success": True,
             "message": f"Executed custom script: {script}",
@@ -1,25 +1,31 @@
 """Main CLI interface for TransactionalInstaller."""
 
 import sys
+import functools
+import itertools
 import logging
+import time
 import click
 from pathlib import Path
 import os
+from typing import TYPE_CHECKING, Optional, Tuple
 
-from core.transaction_manager import TransactionManager
-from metadata.metadata_parser import MetadataParser
 from core.exceptions import TransactionalInstallerError
 
+# Heavy modules (sqlite3, yaml, jsonschema) are imported by the commands
+# that need them, so --help and light commands start quickly
+if TYPE_CHECKING:
+    from metadata.metadata_parser import ParsedPackage
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/var/log/transactional-installer/installer.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+
+LOG_FILE = '/var/log/transactional-installer/installer.log'
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Rows of the list command written to stdout per write
+LIST_BATCH_ROWS = 1000
+
+# Commands that change system state; only these are logged to LOG_FILE
+_LOGGED_COMMANDS = frozenset({"install", "rollback", "cleanup"})
 
 logger = logging.getLogger(__name__)
 
@@ -36,9 +42,12 @@ def cli(ctx, verbose, quiet):
     
     # Set log level based on options
     if verbose:
-        logging.getLogger().setLevel(logging.DEBUG)
+        level = logging.DEBUG
     elif quiet:
-        logging.getLogger().setLevel(logging.ERROR)
+        level = logging.ERROR
+    else:
+        level = logging.INFO
+    _configure_logging(ctx.invoked_subcommand, level)
     
     # Check if running as root
     if not _check_root_privileges():
@@ -55,21 +64,24 @@ def install(ctx, package_file, dry_run, force):
     """Install a package from metadata file."""
     try:
         # Parse metadata
-        parser = MetadataParser()
+        from metadata.metadata_parser import get_parser
+        parser = get_parser()
         metadata = parser.parse_file(package_file)
         
-        package_info = parser.get_package_info(metadata)
-        install_steps = parser.get_install_steps(metadata)
+        package = parser.parse_all(metadata, validated=True)
+        package_info = package.info
+        install_steps = package.install_steps
         
         click.echo(f"Installing package: {package_info['name']} v{package_info['version']}")
         
         if dry_run:
             click.echo("Dry run mode - validating package only")
-            _validate_package(metadata, parser)
+            _validate_package(package)
             click.echo("Package validation successful")
             return
         
         # Initialize transaction manager
+        from core.transaction_manager import TransactionManager
         manager = TransactionManager()
         
         # Begin transaction
@@ -112,6 +124,7 @@ def install(ctx, package_file, dry_run, force):
 def rollback(ctx, transaction_id):
     """Rollback a specific transaction."""
     try:
+        from core.transaction_manager import TransactionManager
         manager = TransactionManager()
         
         # Get transaction status
@@ -140,18 +153,29 @@ def rollback(ctx, transaction_id):
 def list(ctx, limit):
     """List recent transactions."""
     try:
+        from core.transaction_manager import TransactionManager
         manager = TransactionManager()
-        transactions = manager.list_transactions(limit)
+        transactions = manager.iter_transactions(limit)
         
-        if not transactions:
+        first = next(transactions, None)
+        if first is None:
             click.echo("No transactions found.")
             return
         
-        click.echo(f"{'ID':<8} {'Package':<20} {'Status':<15} {'Created':<20}")
-        click.echo("-" * 70)
-        
-        for tx in transactions:
-            click.echo(f"{tx['id']:<8} {tx['package_name']:<20} {tx['status']:<15} {tx['created_at']:<20}")
+        # Rows are streamed from the database and written in batches
+        lines = [
+            f"{'ID':<8} {'Package':<20} {'Status':<15} {'Created':<20}",
+            "-" * 70
+        ]
+        for tx in itertools.chain((first,), transactions):
+            lines.append(
+                f"{tx['id']:<8} {tx['package_name']:<20} {tx['status']:<15} {tx['created_at']:<20}"
+            )
+            if len(lines) >= LIST_BATCH_ROWS:
+                click.echo("\n".join(lines))
+                lines.clear()
+        if lines:
+            click.echo("\n".join(lines))
             
     except Exception as e:
         click.echo(f"Error: {e}", err=True)
@@ -165,6 +189,7 @@ def list(ctx, limit):
 def cleanup(ctx, older_than, dry_run):
     """Clean up old transactions."""
     try:
+        from core.transaction_manager import TransactionManager
         manager = TransactionManager()
         
         if dry_run:
@@ -188,7 +213,8 @@ def cleanup(ctx, older_than, dry_run):
 def create_template(ctx, package_name, version, output):
     """Create a metadata template for a new package."""
     try:
-        parser = MetadataParser()
+        from metadata.metadata_parser import get_parser
+        parser = get_parser()
         template = parser.create_metadata_template(package_name, version)
         
         if output:
@@ -196,7 +222,11 @@ def create_template(ctx, package_name, version, output):
             click.echo(f"Template saved to: {output}")
         else:
             import yaml
-            click.echo(yaml.dump(template, default_flow_style=False, indent=2))
+            try:
+                from yaml import CSafeDumper as SafeDumper
+            except ImportError:
+                from yaml import SafeDumper
+            click.echo(yaml.dump(template, Dumper=SafeDumper, default_flow_style=False, indent=2))
             
     except Exception as e:
         click.echo(f"Error: {e}", err=True)
@@ -209,11 +239,13 @@ def create_template(ctx, package_name, version, output):
 def validate(ctx, package_file):
     """Validate a package metadata file."""
     try:
-        parser = MetadataParser()
+        from metadata.metadata_parser import get_parser
+        parser = get_parser()
         metadata = parser.parse_file(package_file)
         
-        package_info = parser.get_package_info(metadata)
-        install_steps = parser.get_install_steps(metadata)
+        package = parser.parse_all(metadata, validated=True)
+        package_info = package.info
+        install_steps = package.install_steps
         
         click.echo(f"Package: {package_info['name']} v{package_info['version']}")
         click.echo(f"Installation steps: {len(install_steps)}")
@@ -240,6 +272,7 @@ def status(ctx):
         
         # Check database
         try:
+            from core.transaction_manager import TransactionManager
             manager = TransactionManager()
             recent_txs = manager.list_transactions(5)
             click.echo(f"Database: OK ({len(recent_txs)} recent transactions)")
@@ -270,42 +303,75 @@ def status(ctx):
         sys.exit(1)
 
 
+class _CachedTimeFormatter(logging.Formatter):
+    """Formatter that formats the timestamp once per wall-clock second.
+
+    Records emitted within the same second reuse the ``strftime`` result;
+    only the milliseconds are filled in per record.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (second, formatted time), swapped as one tuple so threads never
+        # see a time that belongs to another second
+        self._cached: Tuple[Optional[int], str] = (None, "")
+
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        if datefmt:
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        cached_second, formatted = self._cached
+        if second != cached_second:
+            formatted = time.strftime(self.default_time_format, self.converter(record.created))
+            self._cached = (second, formatted)
+        return self.default_msec_format % (formatted, record.msecs)
+
+
+def _configure_logging(command: str, level: int) -> None:
+    """Configure logging for a CLI invocation.
+
+    Args:
+        command: Name of the invoked subcommand
+        level: Root log level
+    """
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if command in _LOGGED_COMMANDS:
+        handlers.insert(0, logging.FileHandler(LOG_FILE))
+    formatter = _CachedTimeFormatter(LOG_FORMAT)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    logging.basicConfig(level=level, handlers=handlers)
+
+
+# Windows doesn't have geteuid
+_HAS_GETEUID = hasattr(os, "geteuid")
+
+
+@functools.lru_cache(maxsize=1)
 def _check_root_privileges() -> bool:
     """Check if the script is running with root privileges."""
-    try:
-        return os.geteuid() == 0
-    except AttributeError:
-        # Windows doesn't have geteuid
+    if not _HAS_GETEUID:
         return True
+    return os.geteuid() == 0
 
 
-def _validate_package(metadata: dict, parser: MetadataParser) -> None:
-    """Validate a package without installing it."""
-    # Validate metadata structure
-    parser.validate_metadata(metadata)
-    
-    # Extract and validate components
-    package_info = parser.get_package_info(metadata)
-    install_steps = parser.get_install_steps(metadata)
-    
-    # Validate each step
-    for step in install_steps:
-        parser.validate_step(step)
-    
+def _validate_package(package: "ParsedPackage") -> None:
+    """Validate a package without installing it.
+
+    The metadata structure, package info and steps were already validated
+    while parsing; this reports the remaining components.
+    """
     # Check dependencies
-    dependencies = parser.get_dependencies(metadata)
-    if dependencies:
-        click.echo(f"Dependencies: {', '.join(dependencies)}")
+    if package.dependencies:
+        click.echo(f"Dependencies: {', '.join(package.dependencies)}")
     
     # Check conflicts
-    conflicts = parser.get_conflicts(metadata)
-    if conflicts:
-        click.echo(f"Conflicts: {', '.join(conflicts)}")
+    if package.conflicts:
+        click.echo(f"Conflicts: {', '.join(package.conflicts)}")
     
     # Check requirements
-    requirements = parser.get_requirements(metadata)
-    if requirements:
-        click.echo(f"Requirements: {requirements}")
+    if package.requirements:
+        click.echo(f"Requirements: {package.requirements}")
 
 
 def main():
@@ -10,13 +10,12 @@ logger = logging.getLogger(__name__)
 class RollbackEngine:
     """Handles rollback operations for failed transactions."""
 
-    def __init__(self):
-        """Initialize rollback engine."""
-        self.rollback_handlers = {
-            "apt_package": self._rollback_apt_package,
-            "file_copy": self._rollback_file_copy,
-            "custom_script": self._rollback_custom_script,
-        }
+    # Step type -> name of the method rolling it back
+    ROLLBACK_HANDLERS = {
+        "apt_package": "_rollback_apt_package",
+        "file_copy": "_rollback_file_copy",
+        "custom_script": "_rollback_custom_script",
+    }
 
     def rollback_step(self, step: Dict[str, Any], snapshot: Dict[str, Any]) -> Dict[str, Any]:
         """Rollback a single step.
@@ -35,16 +34,17 @@ class RollbackEngine:
         step_data = step.get("step_data", {})
         step_type = step_data.get("type")
         
-        if step_type not in self.rollback_handlers:
+        handler_name = self.ROLLBACK_HANDLERS.get(step_type)
+        if handler_name is None:
             raise RollbackError(f"Unknown step type for rollback: {step_type}")
         
         try:
-            logger.info(f"Rolling back step: {step_type}")
-            result = self.rollback_handlers[step_type](step_data, snapshot.get("snapshot_data", {}))
-            logger.info(f"Successfully rolled back step: {step_type}")
+            logger.info("Rolling back step: %s", step_type)
+            result = getattr(self, handler_name)(step_data, snapshot.get("snapshot_data", {}))
+            logger.info("Successfully rolled back step: %s", step_type)
             return result
         except Exception as e:
-            logger.error(f"Failed to rollback step {step_type}: {e}")
+            logger.error("Failed to rollback step %s: %s", step_type, e)
             raise RollbackError(f"Rollback failed for {step_type}: {e}")
 
     def rollback_transaction(self, steps: List[Dict[str, Any]], snapshots: List[Dict[str, Any]]) -> None:
@@ -57,14 +57,18 @@ class RollbackEngine:
         Raises:
             RollbackError: If any rollback step fails
         """
-        logger.info(f"Starting rollback for {len(steps)} steps")
+        logger.info("Starting rollback for %s steps", len(steps))
         
-        # Rollback steps in reverse order
-        for i in range(len(steps) - 1, -1, -1):
+        # Rollback steps in reverse order; pair from the front so an extra
+        # trailing snapshot cannot shift the pairing
+        for i, (step, snapshot) in reversed(list(enumerate(zip(steps, snapshots)))):
+            if step.get("status") == "skipped":
+                # Nothing was changed by this step
+                continue
             try:
-                self.rollback_step(steps[i], snapshots[i])
+                self.rollback_step(step, snapshot)
             except RollbackError as e:
-                logger.error(f"Rollback failed at step {i}: {e}")
+                logger.error("Rollback failed at step %s: %s", i, e)
                 raise
 
     def _rollback_apt_package(self, step: Dict[str, Any], snapshot: Dict[str, Any]) -> Dict[str, Any]:
@@ -82,12 +86,12 @@ class RollbackEngine:
         
         if action == "install":
             # Remove packages that were installed
-            logger.info(f"Removing packages: {packages}")
+            logger.info("Removing packages: %s", packages)
             # Here you would call the actual package removal logic
             return {"success": True, "message": f"Removed packages: {packages}"}
         elif action == "remove":
             # Reinstall packages that were removed
-            logger.info(f"Reinstalling packages: {packages}")
+            logger.info("Reinstalling packages: %s", packages)
             # Here you would call the actual package installation logic
             return {"success": True, "message": f"Reinstalled packages: {packages}"}
         else:
@@ -109,12 +113,12 @@ class RollbackEngine:
         if rollback_type == "restore_original":
             # Restore original file from snapshot
             if "original_file" in snapshot:
-                logger.info(f"Restoring original file: {dest}")
+                logger.info("Restoring original file: %s", dest)
                 # Here you would restore the original file
                 return {"success": True, "message": f"Restored original file: {dest}"}
             else:
                 # Remove the file if no original exists
-                logger.info(f"Removing file: {dest}")
+                logger.info("Removing file: %s", dest)
                 # Here you would remove the file
                 return {"success": True, "message": f"Removed file: {dest}"}
         else:
@@ -133,7 +137,7 @@ class RollbackEngine:
         rollback_script = step.get("rollback_script")
         
         if rollback_script:
-            logger.info(f"Executing rollback script: {rollback_script}")
+            logger.info("Executing rollback script: %s", rollback_script)
             # Here you would execute the rollback script
             return {"success": True, "message": f"Executed rollback script: {rollback_script}"}
         else:
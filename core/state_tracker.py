@@ -1,20 +1,36 @@
 """State tracker for creating and managing system snapshots."""
 
+import grp
 import os
-import shutil
+import pwd
 import stat
 import json
 import logging
-from typing import Dict, Any, Optional
+import tempfile
+import time
+from typing import Dict, Any, FrozenSet, List, Optional, Set, Tuple
 from pathlib import Path
 import subprocess
 
 from .exceptions import SnapshotError
+from backends.simple_handlers import fast_copy, spawn_options
 
 
 logger = logging.getLogger(__name__)
 
 
+# dpkg database; rewritten by dpkg on every package state change
+DPKG_STATUS_FILE = "/var/lib/dpkg/status"
+
+# ActiveState values for which ``systemctl is-active`` succeeds
+_ACTIVE_STATES = frozenset({"active", "reloading"})
+
+# UnitFileState values for which ``systemctl is-enabled`` succeeds
+_ENABLED_STATES = frozenset({
+    "enabled", "enabled-runtime", "alias", "static", "indirect", "generated", "transient"
+})
+
+
 class StateTracker:
     """Tracks system state and creates snapshots for rollback."""
 
@@ -25,11 +41,15 @@ class StateTracker:
             snapshot_dir: Directory to store snapshots (defaults to temp directory if not provided)
         """
         if snapshot_dir is None:
-            import tempfile
             self.snapshot_dir = Path(tempfile.mkdtemp(prefix="transactional_installer_"))
         else:
             self.snapshot_dir = Path(snapshot_dir)
             self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        # String form for building backup paths without Path objects
+        self._snapshot_dir = str(self.snapshot_dir)
+
+        # ((mtime_ns, size) of the dpkg status file, installed package names)
+        self._dpkg_status: Optional[Tuple[Tuple[int, int], FrozenSet[str]]] = None
 
     def create_snapshot(self, step: Dict[str, Any]) -> Dict[str, Any]:
         """Create a snapshot of current system state based on step type.
@@ -41,26 +61,29 @@ class StateTracker:
             Snapshot data
         """
         step_type = step.get("type")
+        # One timestamp per snapshot, shared with its backup file name
+        timestamp = time.time()
         
         if step_type == "file_copy":
-            return self._create_file_snapshot(step)
+            return self._create_file_snapshot(step, timestamp)
         elif step_type == "apt_package":
-            return self._create_package_snapshot(step)
+            return self._create_package_snapshot(step, timestamp)
         elif step_type == "systemd_service":
-            return self._create_service_snapshot(step)
+            return self._create_service_snapshot(step, timestamp)
         elif step_type == "user_management":
-            return self._create_user_snapshot(step)
+            return self._create_user_snapshot(step, timestamp)
         elif step_type == "ansible_playbook":
-            return self._create_ansible_snapshot(step)
+            return self._create_ansible_snapshot(step, timestamp)
         else:
             logger.warning(f"Unknown step type: {step_type}, creating minimal snapshot")
-            return {"type": "minimal", "timestamp": self._get_timestamp()}
+            return {"type": "minimal", "timestamp": timestamp}
 
-    def _create_file_snapshot(self, step: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_file_snapshot(self, step: Dict[str, Any], timestamp: float) -> Dict[str, Any]:
         """Create snapshot for file operations.
 
         Args:
             step: File operation step
+            timestamp: Time the snapshot is taken
 
         Returns:
             File snapshot data
@@ -72,28 +95,34 @@ class StateTracker:
         snapshot = {
             "type": "file",
             "path": dest_path,
-            "timestamp": self._get_timestamp()
+            "timestamp": timestamp
         }
 
         try:
-            if os.path.exists(dest_path):
-                # Get file info
-                stat_info = os.stat(dest_path)
-                snapshot.update({
-                    "exists": True,
-                    "size": stat_info.st_size,
-                    "permissions": stat_info.st_mode,
-                    "owner": stat_info.st_uid,
-                    "group": stat_info.st_gid,
-                    "modified": stat_info.st_mtime
-                })
-                
-                # Create backup if file exists
-                backup_path = self._create_file_backup(dest_path)
-                if backup_path:
-                    snapshot["backup_path"] = str(backup_path)
-            else:
-                snapshot["exists"] = False
+            # Get file info; a single stat also tells whether the file exists
+            stat_info = os.stat(dest_path)
+        except FileNotFoundError:
+            snapshot["exists"] = False
+            return snapshot
+        except Exception as e:
+            logger.error(f"Failed to create file snapshot for {dest_path}: {e}")
+            snapshot["error"] = str(e)
+            return snapshot
+
+        try:
+            snapshot.update({
+                "exists": True,
+                "size": stat_info.st_size,
+                "permissions": stat_info.st_mode,
+                "owner": stat_info.st_uid,
+                "group": stat_info.st_gid,
+                "modified": stat_info.st_mtime
+            })
+            
+            # Create backup if file exists
+            backup_path = self._create_file_backup(dest_path, timestamp)
+            if backup_path:
+                snapshot["backup_path"] = backup_path
 
         except Exception as e:
             logger.error(f"Failed to create file snapshot for {dest_path}: {e}")
@@ -101,11 +130,12 @@ class StateTracker:
 
         return snapshot
 
-    def _create_package_snapshot(self, step: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_package_snapshot(self, step: Dict[str, Any], timestamp: float) -> Dict[str, Any]:
         """Create snapshot for package operations.
 
         Args:
             step: Package operation step
+            timestamp: Time the snapshot is taken
 
         Returns:
             Package snapshot data
@@ -117,7 +147,7 @@ class StateTracker:
             "type": "package",
             "action": action,
             "packages": packages,
-            "timestamp": self._get_timestamp()
+            "timestamp": timestamp
         }
 
         try:
@@ -136,11 +166,12 @@ class StateTracker:
 
         return snapshot
 
-    def _create_service_snapshot(self, step: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_service_snapshot(self, step: Dict[str, Any], timestamp: float) -> Dict[str, Any]:
         """Create snapshot for systemd service operations.
 
         Args:
             step: Service operation step
+            timestamp: Time the snapshot is taken
 
         Returns:
             Service snapshot data
@@ -152,7 +183,7 @@ class StateTracker:
             "type": "service",
             "service": service_name,
             "action": action,
-            "timestamp": self._get_timestamp()
+            "timestamp": timestamp
         }
 
         try:
@@ -167,11 +198,12 @@ class StateTracker:
 
         return snapshot
 
-    def _create_user_snapshot(self, step: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_user_snapshot(self, step: Dict[str, Any], timestamp: float) -> Dict[str, Any]:
         """Create snapshot for user management operations.
 
         Args:
             step: User operation step
+            timestamp: Time the snapshot is taken
 
         Returns:
             User snapshot data
@@ -183,7 +215,7 @@ class StateTracker:
             "type": "user",
             "username": username,
             "action": action,
-            "timestamp": self._get_timestamp()
+            "timestamp": timestamp
         }
 
         try:
@@ -203,11 +235,12 @@ class StateTracker:
 
         return snapshot
 
-    def _create_ansible_snapshot(self, step: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_ansible_snapshot(self, step: Dict[str, Any], timestamp: float) -> Dict[str, Any]:
         """Create snapshot for Ansible playbook operations.
 
         Args:
             step: Ansible operation step
+            timestamp: Time the snapshot is taken
 
         Returns:
             Ansible snapshot data
@@ -219,33 +252,37 @@ class StateTracker:
             "type": "ansible",
             "playbook": playbook,
             "vars": vars_data,
-            "timestamp": self._get_timestamp()
+            "timestamp": timestamp
         }
 
         # For Ansible, we mainly track the playbook and variables
         # The actual state changes will be handled by the playbook itself
         return snapshot
 
-    def _create_file_backup(self, file_path: str) -> Optional[Path]:
+    def _create_file_backup(self, file_path: str, timestamp: float) -> Optional[str]:
         """Create a backup of a file.
 
         Args:
             file_path: Path to the file to backup
+            timestamp: Time the snapshot is taken, used in the backup name
 
         Returns:
             Path to backup file or None if failed
         """
         try:
-            source_path = Path(file_path)
-            if not source_path.exists():
-                return None
-
-            # Create backup filename
-            backup_name = f"{source_path.name}.backup.{int(self._get_timestamp())}"
-            backup_path = self.snapshot_dir / backup_name
+            # Create a unique backup file; snapshots may be taken concurrently
+            fd, backup_path = tempfile.mkstemp(
+                prefix=f"{os.path.basename(file_path)}.backup.{int(timestamp)}.",
+                dir=self._snapshot_dir
+            )
+            os.close(fd)
 
-            # Copy file
-            shutil.copy2(source_path, backup_path)
+            # Copy file in the kernel (reflink where supported), like copy2
+            try:
+                fast_copy(file_path, backup_path)
+            except OSError:
+                os.unlink(backup_path)
+                raise
             logger.info(f"Created backup: {backup_path}")
             
             return backup_path
@@ -257,25 +294,87 @@ class StateTracker:
     def _get_installed_packages(self, packages: list) -> list:
         """Get list of packages that are already installed.
 
+        Answered from the dpkg status file, which is parsed once and again
+        only after dpkg has changed it. If it cannot be read, all packages
+        are looked up with a single ``dpkg-query`` call instead.
+
         Args:
             packages: List of package names to check
 
         Returns:
             List of installed packages
         """
-        installed = []
-        for package in packages:
-            try:
-                result = subprocess.run(
-                    ["dpkg", "-s", package],
-                    capture_output=True,
-                    text=True,
-                    check=False
-                )
-                if result.returncode == 0:
-                    installed.append(package)
-            except Exception as e:
-                logger.warning(f"Failed to check package {package}: {e}")
+        if not packages:
+            return []
+
+        try:
+            installed = self._read_dpkg_status()
+        except OSError as e:
+            logger.debug(f"Cannot read {DPKG_STATUS_FILE}, using dpkg-query: {e}")
+            installed = self._query_installed_packages(packages)
+
+        return [package for package in packages if package in installed]
+
+    def _read_dpkg_status(self) -> FrozenSet[str]:
+        """Get the names of installed packages from the dpkg status file.
+
+        Returns:
+            Installed package names
+
+        Raises:
+            OSError: If the status file cannot be read
+        """
+        st = os.stat(DPKG_STATUS_FILE)
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self._dpkg_status
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        installed = set()
+        package = None
+        with open(DPKG_STATUS_FILE, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if line.startswith("Package:"):
+                    package = line[8:].strip()
+                elif line.startswith("Status:") and package:
+                    # "<want> <flag> <status>", e.g. "hold ok installed"
+                    if line.split()[-1] == "installed":
+                        installed.add(package)
+                elif not line.strip():
+                    package = None
+
+        self._dpkg_status = (key, frozenset(installed))
+        return self._dpkg_status[1]
+
+    def _query_installed_packages(self, packages: list) -> Set[str]:
+        """Get the installed packages among ``packages`` with ``dpkg-query``.
+
+        Args:
+            packages: List of package names to check
+
+        Returns:
+            Installed package names
+        """
+        try:
+            # Exits non-zero if some packages are unknown, but still lists the rest
+            cmd = ["dpkg-query", "-W", "-f=${Package}\t${db:Status-Abbrev}\n", *packages]
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                check=False,
+                **spawn_options(cmd)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to check packages {packages}: {e}")
+            return set()
+
+        installed = set()
+        for line in result.stdout.splitlines():
+            name, _, status = line.partition("\t")
+            # Second letter is the current state; "i" means installed
+            if status[1:2] == "i":
+                installed.add(name)
 
         return installed
 
@@ -288,33 +387,45 @@ class StateTracker:
         Returns:
             Service status information
         """
+        return self._get_service_status_batch([service_name])[service_name]
+
+    def _get_service_status_batch(self, service_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get current status of several systemd services with one ``systemctl show``.
+
+        Args:
+            service_names: Names of the services
+
+        Returns:
+            Mapping of service name to its status information
+        """
         try:
+            cmd = ["systemctl", "show", "--no-pager",
+                   "-p", "ActiveState", "-p", "UnitFileState", *service_names]
             result = subprocess.run(
-                ["systemctl", "is-active", service_name],
+                cmd,
                 capture_output=True,
                 text=True,
-                check=False
+                check=False,
+                **spawn_options(cmd)
             )
-            
-            is_active = result.returncode == 0
-            
-            result = subprocess.run(
-                ["systemctl", "is-enabled", service_name],
-                capture_output=True,
-                text=True,
-                check=False
+        except Exception as e:
+            logger.warning(f"Failed to get service status for {service_names}: {e}")
+            return {name: {"error": str(e)} for name in service_names}
+
+        # One blank-line separated block per unit, in argument order
+        blocks = result.stdout.split("\n\n")
+        statuses = {}
+        for index, name in enumerate(service_names):
+            block = blocks[index] if index < len(blocks) else ""
+            properties = dict(
+                line.split("=", 1) for line in block.splitlines() if "=" in line
             )
-            
-            is_enabled = result.returncode == 0
-
-            return {
-                "active": is_active,
-                "enabled": is_enabled
+            statuses[name] = {
+                "active": properties.get("ActiveState") in _ACTIVE_STATES,
+                "enabled": properties.get("UnitFileState") in _ENABLED_STATES
             }
 
-        except Exception as e:
-            logger.warning(f"Failed to get service status for {service_name}: {e}")
-            return {"error": str(e)}
+        return statuses
 
     def _check_user_exists(self, username: str) -> bool:
         """Check if a user exists.
@@ -326,13 +437,9 @@ class StateTracker:
             True if user exists, False otherwise
         """
         try:
-            result = subprocess.run(
-                ["id", username],
-                capture_output=True,
-                check=False
-            )
-            return result.returncode == 0
-        except Exception:
+            pwd.getpwnam(username)
+            return True
+        except KeyError:
             return False
 
     def _get_user_info(self, username: str) -> Dict[str, Any]:
@@ -345,29 +452,26 @@ class StateTracker:
             User information
         """
         try:
-            result = subprocess.run(
-                ["id", username],
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            
-            if result.returncode == 0:
-                return {"id_output": result.stdout.strip()}
-            else:
-                return {"error": "User not found"}
+            pw = pwd.getpwnam(username)
+        except KeyError:
+            return {"error": "User not found"}
 
-        except Exception as e:
+        try:
+            groups = [
+                grp.getgrgid(gid).gr_name
+                for gid in os.getgrouplist(username, pw.pw_gid)
+            ]
+        except (KeyError, OSError) as e:
             return {"error": str(e)}
 
-    def _get_timestamp(self) -> float:
-        """Get current timestamp.
-
-        Returns:
-            Current timestamp
-        """
-        import time
-        return time.time()
+        return {
+            "uid": pw.pw_uid,
+            "gid": pw.pw_gid,
+            "gecos": pw.pw_gecos,
+            "home": pw.pw_dir,
+            "shell": pw.pw_shell,
+            "groups": groups
+        }
 
     def cleanup_snapshots(self, transaction_id: int) -> None:
         """Clean up snapshots for a completed transaction.
@@ -424,7 +528,7 @@ class StateTracker:
             backup_path = snapshot.get("backup_path")
             
             if backup_path and os.path.exists(backup_path):
-                shutil.copy2(backup_path, file_path)
+                fast_copy(backup_path, file_path)
                 logger.info(f"Restored file: {file_path}")
                 return True
             elif not snapshot.get("exists", True):
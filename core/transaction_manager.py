@@ -1,7 +1,7 @@
 """Transaction manager for handling atomic installations."""
 
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any
 from datetime import datetime
 import hashlib
 import json
@@ -10,7 +10,7 @@ from .exceptions import TransactionError, RollbackError
 from .state_tracker import StateTracker
 from .rollback_engine import RollbackEngine
 from storage.transaction_db import TransactionDB
-from backends.step_executor import StepExecutor
+from backends.step_executor import StepExecutor, step_runs
 
 
 logger = logging.getLogger(__name__)
@@ -59,6 +59,11 @@ class TransactionManager:
     def execute_steps(self, steps: List[Dict[str, Any]]) -> None:
         """Execute installation steps within a transaction.
 
+        Each step is snapshotted and recorded before it runs and marked
+        completed as soon as it has run. Consecutive apt steps touching
+        disjoint package sets (see ``step_runs``) are recorded one by one and
+        then applied with a single apt run.
+
         Args:
             steps: List of installation steps
 
@@ -68,48 +73,133 @@ class TransactionManager:
         if not self.current_transaction_id:
             raise TransactionError("No active transaction")
 
-        for step_order, step in enumerate(steps, 1):
+        if any("depends_on" in step for step in steps):
+            self._execute_step_graph(steps)
+            return
+
+        for run in step_runs(steps):
+            pending: List[int] = []
+            running = False
+            step_order = run[0] + 1
             try:
-                logger.info(f"Executing step {step_order}: {step.get('type', 'unknown')}")
-                
-                # Create snapshot before step execution
-                snapshot = self.state_tracker.create_snapshot(step)
-                self.db.save_snapshot(
-                    self.current_transaction_id, 
-                    step_order, 
-                    snapshot
-                )
-                
-                # Record step in database
-                self.db.record_step(
-                    transaction_id=self.current_transaction_id,
-                    step_order=step_order,
-                    step_type=step.get("type"),
-                    step_data=step,
-                    status="pending"
-                )
-                
-                # Execute step
-                result = self.step_executor.execute_step(step)
-                
-                # Update step status
-                self.db.update_step_status(
-                    self.current_transaction_id, 
-                    step_order, 
-                    "completed"
-                )
+                # Steps of a run touch disjoint packages, so each snapshot
+                # still holds when the run is applied
+                for step_order in (index + 1 for index in run):
+                    if self._record_step(step_order, steps[step_order - 1]):
+                        logger.info(f"Step {step_order} skipped, nothing to change")
+                    else:
+                        pending.append(step_order)
+                if not pending:
+                    continue
                 
-                logger.info(f"Step {step_order} completed successfully")
+                # Execute the run; consecutive apt steps share one apt call
+                running = True
+                self.step_executor.execute_steps([steps[order - 1] for order in pending])
                 
             except Exception as e:
-                logger.error(f"Step {step_order} failed: {e}")
+                failed = pending if running else [step_order]
+                label = ", ".join(map(str, failed))
+                logger.error(f"Step {label} failed: {e}")
+                for order in failed:
+                    self.db.update_step_status(
+                        self.current_transaction_id, 
+                        order, 
+                        "failed"
+                    )
+                self.rollback_transaction()
+                raise TransactionError(f"Step {label} failed: {e}")
+            
+            # Persist completion before the next run starts, so recovery
+            # never mistakes an applied step for a pending one
+            for order in pending:
                 self.db.update_step_status(
                     self.current_transaction_id, 
-                    step_order, 
-                    "failed"
+                    order, 
+                    "completed"
                 )
-                self.rollback_transaction()
-                raise TransactionError(f"Step {step_order} failed: {e}")
+                logger.info(f"Step {order} completed successfully")
+
+    def _execute_step_graph(self, steps: List[Dict[str, Any]]) -> None:
+        """Execute steps with declared dependencies, independent ones in parallel.
+
+        Args:
+            steps: List of installation steps
+
+        Raises:
+            TransactionError: If any step fails
+        """
+        def before_step(index: int, step: Dict[str, Any]) -> bool:
+            return self._record_step(index + 1, step)
+
+        def after_step(index: int, step: Dict[str, Any], error: Optional[Exception]) -> None:
+            status = "failed" if error else "completed"
+            self.db.update_step_status(self.current_transaction_id, index + 1, status)
+            if error:
+                logger.error(f"Step {index + 1} failed: {error}")
+            else:
+                logger.info(f"Step {index + 1} completed successfully")
+
+        try:
+            self.step_executor.execute_dag(steps, before_step=before_step, after_step=after_step)
+        except Exception as e:
+            self.rollback_transaction()
+            raise TransactionError(f"Step execution failed: {e}")
+
+    def _record_step(self, step_order: int, step: Dict[str, Any]) -> bool:
+        """Snapshot state and record a step as pending before it runs.
+
+        A step the snapshot shows to be a no-op is recorded as skipped.
+        Safe to call from several threads: snapshots of independent steps
+        are taken concurrently, only the database write is serialized.
+
+        Args:
+            step_order: Position of the step in the transaction
+            step: Step configuration
+
+        Returns:
+            True if the step should be skipped
+        """
+        logger.info(f"Executing step {step_order}: {step.get('type', 'unknown')}")
+        
+        # Create snapshot before step execution
+        snapshot = self.state_tracker.create_snapshot(step)
+        skipped = self._is_noop(step, snapshot)
+        
+        # Record step and its snapshot with a single database commit
+        self.db.record_step(
+            transaction_id=self.current_transaction_id,
+            step_order=step_order,
+            step_type=step.get("type"),
+            step_data=step,
+            status="skipped" if skipped else "pending",
+            snapshot=snapshot
+        )
+        return skipped
+
+    @staticmethod
+    def _is_noop(step: Dict[str, Any], snapshot: Dict[str, Any]) -> bool:
+        """Check whether a step would leave the system unchanged.
+
+        Only apt steps are checked here; service steps already skip units
+        in the target state when they run.
+
+        Args:
+            step: Step configuration
+            snapshot: Snapshot taken right before the step
+
+        Returns:
+            True if the step has nothing to do
+        """
+        packages = step.get("packages")
+        if step.get("type") != "apt_package" or not packages or "error" in snapshot:
+            return False
+
+        action = step.get("action", "install")
+        if action == "install":
+            return snapshot.get("already_installed") == packages
+        if action == "remove":
+            return snapshot.get("to_remove") == []
+        return False
 
     def commit_transaction(self) -> None:
         """Commit the current transaction.
@@ -185,6 +275,17 @@ class TransactionManager:
         """
         return self.db.list_transactions(limit)
 
+    def iter_transactions(self, limit: int = 50) -> Iterator[Dict[str, Any]]:
+        """Iterate over recent transactions without loading them all at once.
+
+        Args:
+            limit: Maximum number of transactions to yield
+
+        Yields:
+            Transaction information
+        """
+        return self.db.iter_transactions(limit)
+
     def cleanup_old_transactions(self, days: int = 30) -> int:
         """Clean up old transactions.
 
@@ -1,25 +1,258 @@
 """Parser for package metadata files."""
 
+import functools
+import os
+import re
 import yaml
 import json
 import logging
-from typing import Dict, Any, List
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Dict, Any, Iterator, List, Tuple
 from pathlib import Path
 
-from jsonschema import validate, ValidationError
-from .package_schema import PACKAGE_SCHEMA, STEP_SCHEMA, PACKAGE_INFO_SCHEMA
+from jsonschema import Draft7Validator, ValidationError, validators
+from jsonschema.exceptions import best_match
+from jsonschema.protocols import Validator
+
+# libyaml-backed loader/dumper when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+# orjson when installed; its decode error subclasses json.JSONDecodeError
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+from .package_schema import (
+    PACKAGE_SCHEMA, STEP_BASE_SCHEMA, STEP_SCHEMA, STEP_TYPE_SCHEMAS, PACKAGE_INFO_SCHEMA
+)
 from core.exceptions import MetadataError, ValidationError as CustomValidationError
 
 
 logger = logging.getLogger(__name__)
 
 
+# PACKAGE_SCHEMA checking only the properties shared by all step types; the
+# type-specific part of each step is checked by dispatching on its type
+_PACKAGE_ENVELOPE_SCHEMA = {
+    **PACKAGE_SCHEMA,
+    "properties": {
+        **PACKAGE_SCHEMA["properties"],
+        "install_steps": {
+            **PACKAGE_SCHEMA["properties"]["install_steps"],
+            "items": STEP_BASE_SCHEMA
+        }
+    }
+}
+
+# Metadata sections that merge_metadata appends to rather than updates
+_APPENDED_SECTIONS = ("install_steps", "pre_install", "post_install", "dependencies", "conflicts")
+
+# Schemas by name, compiled into validators on first use
+_SCHEMAS = {
+    "package": _PACKAGE_ENVELOPE_SCHEMA,
+    "step": STEP_SCHEMA,
+    "package_info": PACKAGE_INFO_SCHEMA,
+    # Type-specific part only, for steps whose shared properties were checked
+    **{f"step_type.{step_type}": schema for step_type, schema in STEP_TYPE_SCHEMAS.items()},
+    # Shared and type-specific properties, checked in a single pass
+    **{
+        f"step.{step_type}": {
+            **STEP_BASE_SCHEMA,
+            "required": STEP_BASE_SCHEMA["required"] + schema["required"],
+            "properties": {**STEP_BASE_SCHEMA["properties"], **schema["properties"]}
+        }
+        for step_type, schema in STEP_TYPE_SCHEMAS.items()
+    },
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_pattern(pattern: str) -> "re.Pattern[str]":
+    """Compile a schema ``pattern`` once per process.
+
+    Args:
+        pattern: Regular expression from a schema
+
+    Returns:
+        Compiled pattern
+    """
+    return re.compile(pattern)
+
+
+def _pattern(validator, pattern, instance, schema):
+    """``pattern`` keyword using precompiled patterns instead of ``re.search``."""
+    if validator.is_type(instance, "string") and not _compile_pattern(pattern).search(instance):
+        yield ValidationError(f"{instance!r} does not match {pattern!r}")
+
+
+_draft7_enum = Draft7Validator.VALIDATORS["enum"]
+
+
+def _enum(validator, enums, instance, schema):
+    """``enum`` keyword matching strings with a plain ``in`` before the generic check.
+
+    All schema enums list strings, which only compare equal to strings, so
+    a string found by ``in`` is valid without the per-member ``equal`` calls.
+    """
+    if type(instance) is str and instance in enums:
+        return
+    yield from _draft7_enum(validator, enums, instance, schema)
+
+
+# Draft 7 validator whose patterns do not depend on the ``re`` module cache
+# and whose string enums are matched in C
+_MetadataValidator = validators.extend(Draft7Validator, {"pattern": _pattern, "enum": _enum})
+
+
+@functools.lru_cache(maxsize=None)
+def _validator(schema_name: str) -> Validator:
+    """Get the compiled validator for a schema, checking the schema once.
+
+    Args:
+        schema_name: Key in ``_SCHEMAS``
+
+    Returns:
+        Validator for the schema
+    """
+    schema = _SCHEMAS[schema_name]
+    _MetadataValidator.check_schema(schema)
+    return _MetadataValidator(schema)
+
+
+def _validate(instance: Any, schema_name: str) -> None:
+    """Validate an instance, raising the most relevant error like ``jsonschema.validate``.
+
+    Args:
+        instance: Data to validate
+        schema_name: Key in ``_SCHEMAS``
+
+    Raises:
+        jsonschema.ValidationError: If validation fails
+    """
+    error = best_match(_validator(schema_name).iter_errors(instance))
+    if error is not None:
+        raise error
+
+
+def _validate_step_type(step: Any) -> None:
+    """Validate a step against the schema of its type only.
+
+    Steps whose type is unknown are left to the ``step`` schema.
+
+    Args:
+        step: Step to validate
+
+    Raises:
+        jsonschema.ValidationError: If validation fails
+    """
+    schema_name = f"step_type.{step.get('type')}" if isinstance(step, dict) else None
+    if schema_name in _SCHEMAS:
+        _validate(step, schema_name)
+
+
+def _validate_steps(steps: List[Dict[str, Any]]) -> None:
+    """Validate steps, each with the single schema of its type.
+
+    Args:
+        steps: Steps to validate
+
+    Raises:
+        jsonschema.ValidationError: If a step is invalid
+    """
+    for step in steps:
+        schema_name = f"step.{step.get('type')}" if isinstance(step, dict) else "step"
+        _validate(step, schema_name if schema_name in _SCHEMAS else "step")
+
+
+def _clone_metadata(value: Any) -> Any:
+    """Deep-copy JSON-shaped metadata (dicts, lists and scalars).
+
+    Faster than ``copy.deepcopy`` because it skips the memo and the
+    reflective dispatch. Objects shared through YAML aliases are copied
+    separately, which is fine for metadata that is only read or merged.
+
+    Args:
+        value: Metadata or a part of it
+
+    Returns:
+        Independent copy of ``value``
+    """
+    if isinstance(value, dict):
+        return {key: _clone_metadata(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clone_metadata(item) for item in value]
+    return value
+
+
+def _load_metadata(content: str, source: str) -> Any:
+    """Load YAML or JSON metadata, trying the likelier format first.
+
+    Content starting with ``{`` is tried as JSON (parsed by orjson when
+    available, else by the json module) before YAML; anything else is
+    tried as YAML first.
+
+    Args:
+        content: Metadata text
+        source: What is being parsed ("file" or "content"), for messages
+
+    Returns:
+        Loaded metadata
+
+    Raises:
+        MetadataError: If the content is neither valid YAML nor valid JSON
+    """
+    if content.lstrip().startswith("{"):
+        try:
+            return json_loads(content)
+        except json.JSONDecodeError as json_e:
+            # Flow-style YAML such as "{name: demo}" is not JSON
+            try:
+                return yaml.load(content, Loader=SafeLoader)
+            except yaml.YAMLError as e:
+                raise MetadataError(f"Failed to parse metadata {source}: {e} or {json_e}")
+
+    try:
+        return yaml.load(content, Loader=SafeLoader)
+    except yaml.YAMLError as e:
+        # Try to parse as JSON
+        try:
+            return json_loads(content)
+        except json.JSONDecodeError as json_e:
+            raise MetadataError(f"Failed to parse metadata {source}: {e} or {json_e}")
+
+
+@dataclass
+class ParsedPackage:
+    """Components of validated package metadata, extracted in one pass."""
+
+    info: Dict[str, Any]
+    install_steps: List[Dict[str, Any]]
+    dependencies: List[str] = field(default_factory=list)
+    conflicts: List[str] = field(default_factory=list)
+    requirements: Dict[str, Any] = field(default_factory=dict)
+
+
+@functools.lru_cache(maxsize=1)
+def get_parser() -> "MetadataParser":
+    """Get the shared metadata parser.
+
+    Returns:
+        Process-wide MetadataParser instance
+    """
+    return MetadataParser()
+
+
 class MetadataParser:
     """Parser for package metadata files."""
 
     def __init__(self):
         """Initialize metadata parser."""
-        pass
+        # path -> ((st_mtime_ns, st_size), parsed metadata)
+        self._file_cache: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
 
     def parse_file(self, file_path: str) -> Dict[str, Any]:
         """Parse a metadata file.
@@ -33,35 +266,77 @@ class MetadataParser:
         Raises:
             MetadataError: If parsing fails
         """
+        file_path = Path(file_path)
+        
         try:
-            file_path = Path(file_path)
+            stat_info = os.stat(file_path)
             
-            if not file_path.exists():
-                raise MetadataError(f"Metadata file not found: {file_path}")
+            # Unchanged files are served from cache without re-parsing
+            cache_key = str(file_path.resolve())
+            file_key = (stat_info.st_mtime_ns, stat_info.st_size)
+            cached = self._file_cache.get(cache_key)
+            if cached and cached[0] == file_key:
+                return _clone_metadata(cached[1])
             
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
-            
-            # Try to parse as YAML first
-            try:
-                metadata = yaml.safe_load(content)
-            except yaml.YAMLError as e:
-                # Try to parse as JSON
-                try:
-                    metadata = json.loads(content)
-                except json.JSONDecodeError as json_e:
-                    raise MetadataError(f"Failed to parse metadata file: {e} or {json_e}")
-            
-            # Validate the metadata
+        except FileNotFoundError:
+            raise MetadataError(f"Metadata file not found: {file_path}")
+        except (OSError, UnicodeDecodeError) as e:
+            logger.error(f"Failed to parse metadata file: {e}")
+            raise MetadataError(f"Failed to parse metadata file: {e}")
+        
+        metadata = _load_metadata(content, "file")
+        
+        # Validate the metadata
+        try:
             self.validate_metadata(metadata)
-            
-            return metadata
-            
-        except Exception as e:
-            if isinstance(e, MetadataError):
-                raise
+        except CustomValidationError as e:
+            raise MetadataError(f"Failed to parse metadata file: {e}")
+        
+        self._file_cache[cache_key] = (file_key, _clone_metadata(metadata))
+        return metadata
+
+    def parse_stream(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """Parse a YAML file holding several metadata documents.
+
+        Documents are separated by ``---`` and are loaded and validated one
+        at a time, so a bundle is never held in memory as a whole.
+
+        Args:
+            file_path: Path to the metadata bundle
+
+        Yields:
+            Parsed metadata of each document
+
+        Raises:
+            MetadataError: If the file cannot be read or a document is invalid
+        """
+        try:
+            f = open(file_path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            raise MetadataError(f"Metadata file not found: {file_path}")
+        except OSError as e:
             logger.error(f"Failed to parse metadata file: {e}")
             raise MetadataError(f"Failed to parse metadata file: {e}")
+        
+        with f:
+            documents = yaml.load_all(f, Loader=SafeLoader)
+            while True:
+                try:
+                    metadata = next(documents)
+                except StopIteration:
+                    return
+                except (yaml.YAMLError, UnicodeDecodeError) as e:
+                    logger.error(f"Failed to parse metadata file: {e}")
+                    raise MetadataError(f"Failed to parse metadata file: {e}")
+                
+                try:
+                    self.validate_metadata(metadata)
+                except CustomValidationError as e:
+                    raise MetadataError(f"Failed to parse metadata file: {e}")
+                
+                yield metadata
 
     def parse_string(self, content: str) -> Dict[str, Any]:
         """Parse metadata from a string.
@@ -75,27 +350,15 @@ class MetadataParser:
         Raises:
             MetadataError: If parsing fails
         """
+        metadata = _load_metadata(content, "content")
+        
+        # Validate the metadata
         try:
-            # Try to parse as YAML first
-            try:
-                metadata = yaml.safe_load(content)
-            except yaml.YAMLError as e:
-                # Try to parse as JSON
-                try:
-                    metadata = json.loads(content)
-                except json.JSONDecodeError as json_e:
-                    raise MetadataError(f"Failed to parse metadata content: {e} or {json_e}")
-            
-            # Validate the metadata
             self.validate_metadata(metadata)
-            
-            return metadata
-            
-        except Exception as e:
-            if isinstance(e, MetadataError):
-                raise
-            logger.error(f"Failed to parse metadata content: {e}")
+        except CustomValidationError as e:
             raise MetadataError(f"Failed to parse metadata content: {e}")
+        
+        return metadata
 
     def validate_metadata(self, metadata: Dict[str, Any]) -> None:
         """Validate metadata against schema.
@@ -107,7 +370,9 @@ class MetadataParser:
             ValidationError: If validation fails
         """
         try:
-            validate(instance=metadata, schema=PACKAGE_SCHEMA)
+            _validate(metadata, "package")
+            for step in metadata["install_steps"]:
+                _validate_step_type(step)
         except ValidationError as e:
             logger.error(f"Metadata validation failed: {e}")
             raise CustomValidationError(f"Metadata validation failed: {e}")
@@ -122,7 +387,7 @@ class MetadataParser:
             ValidationError: If validation fails
         """
         try:
-            validate(instance=step, schema=STEP_SCHEMA)
+            _validate_steps([step])
         except ValidationError as e:
             logger.error(f"Step validation failed: {e}")
             raise CustomValidationError(f"Step validation failed: {e}")
@@ -137,7 +402,7 @@ class MetadataParser:
             ValidationError: If validation fails
         """
         try:
-            validate(instance=package_info, schema=PACKAGE_INFO_SCHEMA)
+            _validate(package_info, "package_info")
         except ValidationError as e:
             logger.error(f"Package info validation failed: {e}")
             raise CustomValidationError(f"Package info validation failed: {e}")
@@ -166,12 +431,44 @@ class MetadataParser:
         """
         steps = metadata.get("install_steps", [])
         
-        # Validate each step
-        for step in steps:
-            self.validate_step(step)
+        try:
+            _validate_steps(steps)
+        except ValidationError as e:
+            logger.error(f"Step validation failed: {e}")
+            raise CustomValidationError(f"Step validation failed: {e}")
         
         return steps
 
+    def parse_all(self, metadata: Dict[str, Any], validated: bool = False) -> ParsedPackage:
+        """Extract and validate all package components at once.
+
+        Args:
+            metadata: Parsed metadata
+            validated: Whether ``metadata`` already passed ``validate_metadata``
+                unmodified, as returned by ``parse_file`` or ``parse_string``;
+                the package info and steps are then not validated again
+
+        Returns:
+            Package info, install steps, dependencies, conflicts and requirements
+
+        Raises:
+            ValidationError: If the package info or a step is invalid
+        """
+        if validated:
+            info = metadata["package"]
+            install_steps = metadata["install_steps"]
+        else:
+            info = self.get_package_info(metadata)
+            install_steps = self.get_install_steps(metadata)
+        
+        return ParsedPackage(
+            info=info,
+            install_steps=install_steps,
+            dependencies=self.get_dependencies(metadata),
+            conflicts=self.get_conflicts(metadata),
+            requirements=self.get_requirements(metadata)
+        )
+
     def get_pre_install_steps(self, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Extract pre-installation steps from metadata.
 
@@ -286,7 +583,7 @@ class MetadataParser:
             file_path.parent.mkdir(parents=True, exist_ok=True)
             
             with open(file_path, 'w', encoding='utf-8') as f:
-                yaml.dump(metadata, f, default_flow_style=False, indent=2)
+                yaml.dump(metadata, f, Dumper=SafeDumper, default_flow_style=False, indent=2)
             
             logger.info(f"Metadata saved to: {file_path}")
             
@@ -305,34 +602,26 @@ class MetadataParser:
         Returns:
             Merged metadata
         """
-        import copy
+        appended = [key for key in _APPENDED_SECTIONS if key in override_metadata]
         
-        # Deep copy the base metadata
-        merged = copy.deepcopy(base_metadata)
+        # Deep copy the base metadata, except the sections rebuilt below
+        merged = {
+            key: _clone_metadata(value)
+            for key, value in base_metadata.items()
+            if key not in appended
+        }
         
         # Merge package info
         if "package" in override_metadata:
             merged["package"].update(override_metadata["package"])
         
-        # Merge install steps (append)
-        if "install_steps" in override_metadata:
-            merged["install_steps"].extend(override_metadata["install_steps"])
-        
-        # Merge pre-install steps (append)
-        if "pre_install" in override_metadata:
-            merged["pre_install"].extend(override_metadata["pre_install"])
-        
-        # Merge post-install steps (append)
-        if "post_install" in override_metadata:
-            merged["post_install"].extend(override_metadata["post_install"])
-        
-        # Merge dependencies (append)
-        if "dependencies" in override_metadata:
-            merged["dependencies"].extend(override_metadata["dependencies"])
-        
-        # Merge conflicts (append)
-        if "conflicts" in override_metadata:
-            merged["conflicts"].extend(override_metadata["conflicts"])
+        # Merge install steps, pre/post-install steps, dependencies and
+        # conflicts (append), building each list in one go
+        for key in appended:
+            merged[key] = list(chain(
+                map(_clone_metadata, base_metadata.get(key, ())),
+                override_metadata[key]
+            ))
         
         # Merge requirements (update)
         if "requirements" in override_metadata:
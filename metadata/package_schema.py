@@ -1,5 +1,187 @@
 """JSON Schema for package metadata validation."""
 
+# Properties shared by all step types, without the type-specific rules
+STEP_BASE_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-07/schema#",
+    "type": "object",
+    "required": ["type"],
+    "properties": {
+        "type": {
+            "type": "string",
+            "enum": [
+                "apt_package",
+                "file_copy",
+                "systemd_service",
+                "user_management",
+                "ansible_playbook"
+            ],
+            "description": "Type of installation step"
+        },
+        "rollback": {
+            "type": "string",
+            "enum": ["auto", "manual", "ansible"],
+            "default": "auto",
+            "description": "Rollback strategy for this step"
+        },
+        "description": {
+            "type": "string",
+            "description": "Optional step description"
+        },
+        "id": {
+            "type": "string",
+            "description": "Step identifier referenced by depends_on"
+        },
+        "depends_on": {
+            "type": "array",
+            "items": {"type": "string"},
+            "uniqueItems": True,
+            "description": "Ids of earlier steps this step waits for; "
+                           "defaults to the previous step"
+        }
+    }
+}
+
+# Type-specific part of the step schema, keyed by step type
+STEP_TYPE_SCHEMAS = {
+    "apt_package": {
+        "required": ["action", "packages"],
+        "properties": {
+            "action": {
+                "type": "string",
+                "enum": ["install", "remove", "update"],
+                "description": "APT action to perform"
+            },
+            "packages": {
+                "type": "array",
+                "minItems": 1,
+                "items": {
+                    "type": "string",
+                    "pattern": "^[a-zA-Z0-9._+-]+$"
+                },
+                "description": "List of package names"
+            },
+            "update_cache": {
+                "type": "boolean",
+                "default": True,
+                "description": "Whether to update package cache before installation"
+            }
+        }
+    },
+    "file_copy": {
+        "required": ["src", "dest"],
+        "properties": {
+            "src": {
+                "type": "string",
+                "description": "Source file path"
+            },
+            "dest": {
+                "type": "string",
+                "description": "Destination file path"
+            },
+            "owner": {
+                "type": "string",
+                "description": "File owner (username)"
+            },
+            "group": {
+                "type": "string",
+                "description": "File group"
+            },
+            "mode": {
+                "type": "string",
+                "pattern": "^[0-7]{3,4}$",
+                "description": "File permissions in octal format"
+            }
+        }
+    },
+    "systemd_service": {
+        "required": ["service", "action"],
+        "properties": {
+            "service": {
+                "type": "string",
+                "description": "Systemd service name"
+            },
+            "action": {
+                "type": "string",
+                "enum": ["enable", "disable", "start", "stop", "restart"],
+                "description": "Service action to perform"
+            }
+        }
+    },
+    "user_management": {
+        "required": ["username", "action"],
+        "properties": {
+            "username": {
+                "type": "string",
+                "pattern": "^[a-zA-Z_][a-zA-Z0-9_-]*$",
+                "description": "Username"
+            },
+            "action": {
+                "type": "string",
+                "enum": ["create", "remove", "modify"],
+                "description": "User action to perform"
+            },
+            "user_data": {
+                "type": "object",
+                "properties": {
+                    "home": {
+                        "type": "string",
+                        "description": "Home directory path"
+                    },
+                    "shell": {
+                        "type": "string",
+                        "description": "Default shell"
+                    },
+                    "groups": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "List of groups"
+                    },
+                    "system": {
+                        "type": "boolean",
+                        "description": "Whether this is a system user"
+                    }
+                }
+            }
+        }
+    },
+    "ansible_playbook": {
+        "required": ["playbook"],
+        "properties": {
+            "playbook": {
+                "type": "string",
+                "description": "Path to Ansible playbook file"
+            },
+            "rollback_playbook": {
+                "type": "string",
+                "description": "Path to rollback playbook file"
+            },
+            "vars": {
+                "type": "object",
+                "description": "Variables to pass to the playbook"
+            },
+            "inventory": {
+                "type": "string",
+                "description": "Path to inventory file or inventory string"
+            }
+        }
+    }
+}
+
+# Type-specific rules applied to a step according to its type
+_STEP_TYPE_RULES = [
+    {
+        "if": {"properties": {"type": {"const": step_type}}},
+        "then": type_schema
+    }
+    for step_type, type_schema in STEP_TYPE_SCHEMAS.items()
+]
+
+# Schema for individual step validation
+STEP_SCHEMA = {
+    **STEP_BASE_SCHEMA,
+    "allOf": _STEP_TYPE_RULES
+}
+
 PACKAGE_SCHEMA = {
     "$schema": "http://json-schema.org/draft-07/schema#",
     "type": "object",
@@ -40,178 +222,8 @@ PACKAGE_SCHEMA = {
             "items": {
                 "type": "object",
                 "required": ["type"],
-                "properties": {
-                    "type": {
-                        "type": "string",
-                        "enum": [
-                            "apt_package",
-                            "file_copy",
-                            "systemd_service",
-                            "user_management",
-                            "ansible_playbook"
-                        ],
-                        "description": "Type of installation step"
-                    },
-                    "rollback": {
-                        "type": "string",
-                        "enum": ["auto", "manual", "ansible"],
-                        "default": "auto",
-                        "description": "Rollback strategy for this step"
-                    },
-                    "description": {
-                        "type": "string",
-                        "description": "Optional step description"
-                    }
-                },
-                "allOf": [
-                    {
-                        "if": {
-                            "properties": {"type": {"const": "apt_package"}}
-                        },
-                        "then": {
-                            "required": ["action", "packages"],
-                            "properties": {
-                                "action": {
-                                    "type": "string",
-                                    "enum": ["install", "remove", "update"],
-                                    "description": "APT action to perform"
-                                },
-                                "packages": {
-                                    "type": "array",
-                                    "minItems": 1,
-                                    "items": {
-                                        "type": "string",
-                                        "pattern": "^[a-zA-Z0-9._+-]+$"
-                                    },
-                                    "description": "List of package names"
-                                },
-                                "update_cache": {
-                                    "type": "boolean",
-                                    "default": True,
-                                    "description": "Whether to update package cache before installation"
-                                }
-                            }
-                        }
-                    },
-                    {
-                        "if": {
-                            "properties": {"type": {"const": "file_copy"}}
-                        },
-                        "then": {
-                            "required": ["src", "dest"],
-                            "properties": {
-                                "src": {
-                                    "type": "string",
-                                    "description": "Source file path"
-                                },
-                                "dest": {
-                                    "type": "string",
-                                    "description": "Destination file path"
-                                },
-                                "owner": {
-                                    "type": "string",
-                                    "description": "File owner (username)"
-                                },
-                                "group": {
-                                    "type": "string",
-                                    "description": "File group"
-                                },
-                                "mode": {
-                                    "type": "string",
-                                    "pattern": "^[0-7]{3,4}$",
-                                    "description": "File permissions in octal format"
-                                }
-                            }
-                        }
-                    },
-                    {
-                        "if": {
-                            "properties": {"type": {"const": "systemd_service"}}
-                        },
-                        "then": {
-                            "required": ["service", "action"],
-                            "properties": {
-                                "service": {
-                                    "type": "string",
-                                    "description": "Systemd service name"
-                                },
-                                "action": {
-                                    "type": "string",
-                                    "enum": ["enable", "disable", "start", "stop", "restart"],
-                                    "description": "Service action to perform"
-                                }
-                            }
-                        }
-                    },
-                    {
-                        "if": {
-                            "properties": {"type": {"const": "user_management"}}
-                        },
-                        "then": {
-                            "required": ["username", "action"],
-                            "properties": {
-                                "username": {
-                                    "type": "string",
-                                    "pattern": "^[a-zA-Z_][a-zA-Z0-9_-]*$",
-                                    "description": "Username"
-                                },
-                                "action": {
-                                    "type": "string",
-                                    "enum": ["create", "remove", "modify"],
-                                    "description": "User action to perform"
-                                },
-                                "user_data": {
-                                    "type": "object",
-                                    "properties": {
-                                        "home": {
-                                            "type": "string",
-                                            "description": "Home directory path"
-                                        },
-                                        "shell": {
-                                            "type": "string",
-                                            "description": "Default shell"
-                                        },
-                                        "groups": {
-                                            "type": "array",
-                                            "items": {"type": "string"},
-                                            "description": "List of groups"
-                                        },
-                                        "system": {
-                                            "type": "boolean",
-                                            "description": "Whether this is a system user"
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    },
-                    {
-                        "if": {
-                            "properties": {"type": {"const": "ansible_playbook"}}
-                        },
-                        "then": {
-                            "required": ["playbook"],
-                            "properties": {
-                                "playbook": {
-                                    "type": "string",
-                                    "description": "Path to Ansible playbook file"
-                                },
-                                "rollback_playbook": {
-                                    "type": "string",
-                                    "description": "Path to rollback playbook file"
-                                },
-                                "vars": {
-                                    "type": "object",
-                                    "description": "Variables to pass to the playbook"
-                                },
-                                "inventory": {
-                                    "type": "string",
-                                    "description": "Path to inventory file or inventory string"
-                                }
-                            }
-                        }
-                    }
-                ]
+                "properties": STEP_BASE_SCHEMA["properties"],
+                "allOf": _STEP_TYPE_RULES
             }
         },
         "pre_install": {
@@ -306,25 +318,6 @@ PACKAGE_SCHEMA = {
     "additionalProperties": False
 }
 
-# Schema for individual step validation
-STEP_SCHEMA = {
-    "$schema": "http://json-schema.org/draft-07/schema#",
-    "type": "object",
-    "required": ["type"],
-    "properties": {
-        "type": {
-            "type": "string",
-            "enum": [
-                "apt_package",
-                "file_copy",
-                "systemd_service",
-                "user_management",
-                "ansible_playbook"
-            ]
-        }
-    }
-}
-
 # Schema for package info validation
 PACKAGE_INFO_SCHEMA = {
     "$schema": "http://json-schema.org/draft-07/schema#",
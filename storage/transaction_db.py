@@ -3,12 +3,26 @@
 import sqlite3
 import json
 import logging
-from typing import Dict, Any, List, Optional
+import threading
+from contextlib import closing
+from typing import Dict, Any, Iterator, List, Optional
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 
+def _dumps(data: Any) -> str:
+    """Serialize a stored JSON column without padding whitespace.
+
+    Args:
+        data: Data to serialize
+
+    Returns:
+        Compact JSON text
+    """
+    return json.dumps(data, separators=(",", ":"))
+
+
 class TransactionDB:
     """Database interface for transaction storage."""
 
@@ -19,15 +33,29 @@ class TransactionDB:
             db_path: Path to SQLite database file
         """
         self.db_path = db_path
+        # One connection shared by all calls; the lock serializes its use
+        # by the threads of a dependency graph. Single statements commit on
+        # their own; multi-statement writes open a transaction explicitly
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
         self._init_db()
 
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
     def _init_db(self):
         """Initialize database tables."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._lock:
+            # Write-ahead logging lets readers run alongside a writer and
+            # commits with one fsync of the log; the mode is stored in the
+            # database file, so it only needs to be set once
+            if self.db_path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
             
-            # Create transactions table
-            cursor.execute("""
+            self._conn.executescript("""
+                -- Create transactions table
                 CREATE TABLE IF NOT EXISTS transactions (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     package_name TEXT NOT NULL,
@@ -36,11 +64,9 @@ class TransactionDB:
                     status TEXT DEFAULT 'pending',
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Create steps table
-            cursor.execute("""
+                );
+                
+                -- Create steps table
                 CREATE TABLE IF NOT EXISTS steps (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     transaction_id INTEGER NOT NULL,
@@ -50,11 +76,9 @@ class TransactionDB:
                     status TEXT DEFAULT 'pending',
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (transaction_id) REFERENCES transactions (id)
-                )
-            """)
-            
-            # Create snapshots table
-            cursor.execute("""
+                );
+                
+                -- Create snapshots table
                 CREATE TABLE IF NOT EXISTS snapshots (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     transaction_id INTEGER NOT NULL,
@@ -62,10 +86,17 @@ class TransactionDB:
                     snapshot_data TEXT NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (transaction_id) REFERENCES transactions (id)
-                )
+                );
+                
+                -- Index the per-transaction step and snapshot lookups and
+                -- the date-ordered transaction listing
+                CREATE INDEX IF NOT EXISTS idx_steps_transaction_order
+                ON steps (transaction_id, step_order);
+                CREATE INDEX IF NOT EXISTS idx_snapshots_transaction_order
+                ON snapshots (transaction_id, step_order);
+                CREATE INDEX IF NOT EXISTS idx_transactions_created_at
+                ON transactions (created_at);
             """)
-            
-            conn.commit()
 
     def create_transaction(self, package_name: str, metadata_hash: str, metadata: Dict[str, Any]) -> int:
         """Create a new transaction.
@@ -78,18 +109,17 @@ class TransactionDB:
         Returns:
             Transaction ID
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._lock:
+            cursor = self._conn.cursor()
             cursor.execute("""
                 INSERT INTO transactions (package_name, metadata_hash, metadata)
                 VALUES (?, ?, ?)
-            """, (package_name, metadata_hash, json.dumps(metadata)))
-            
-            conn.commit()
+            """, (package_name, metadata_hash, _dumps(metadata)))
             return cursor.lastrowid
 
     def record_step(self, transaction_id: int, step_order: int, step_type: str, 
-                   step_data: Dict[str, Any], status: str = "pending") -> int:
+                   step_data: Dict[str, Any], status: str = "pending",
+                   snapshot: Optional[Dict[str, Any]] = None) -> int:
         """Record a step in the database.
 
         Args:
@@ -98,18 +128,24 @@ class TransactionDB:
             step_type: Type of step
             step_data: Step data
             status: Step status
+            snapshot: Optional state snapshot saved with the step in the
+                same database transaction
 
         Returns:
             Step ID
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
+            conn.execute("BEGIN IMMEDIATE")
             cursor = conn.cursor()
+            if snapshot is not None:
+                cursor.execute("""
+                    INSERT INTO snapshots (transaction_id, step_order, snapshot_data)
+                    VALUES (?, ?, ?)
+                """, (transaction_id, step_order, _dumps(snapshot)))
             cursor.execute("""
                 INSERT INTO steps (transaction_id, step_order, step_type, step_data, status)
                 VALUES (?, ?, ?, ?, ?)
-            """, (transaction_id, step_order, step_type, json.dumps(step_data), status))
-            
-            conn.commit()
+            """, (transaction_id, step_order, step_type, _dumps(step_data), status))
             return cursor.lastrowid
 
     def update_step_status(self, transaction_id: int, step_order: int, status: str):
@@ -120,14 +156,12 @@ class TransactionDB:
             step_order: Step order number
             status: New status
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._lock:
+            cursor = self._conn.cursor()
             cursor.execute("""
                 UPDATE steps SET status = ? 
                 WHERE transaction_id = ? AND step_order = ?
             """, (status, transaction_id, step_order))
-            
-            conn.commit()
 
     def save_snapshot(self, transaction_id: int, step_order: int, snapshot: Dict[str, Any]):
         """Save a state snapshot.
@@ -137,14 +171,12 @@ class TransactionDB:
             step_order: Step order number
             snapshot: State snapshot data
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._lock:
+            cursor = self._conn.cursor()
             cursor.execute("""
                 INSERT INTO snapshots (transaction_id, step_order, snapshot_data)
                 VALUES (?, ?, ?)
-            """, (transaction_id, step_order, json.dumps(snapshot)))
-            
-            conn.commit()
+            """, (transaction_id, step_order, _dumps(snapshot)))
 
     def update_transaction_status(self, transaction_id: int, status: str):
         """Update transaction status.
@@ -153,14 +185,12 @@ class TransactionDB:
             transaction_id: Transaction ID
             status: New status
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._lock:
+            cursor = self._conn.cursor()
             cursor.execute("""
                 UPDATE transactions SET status = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
             """, (status, transaction_id))
-            
-            conn.commit()
 
     def commit_transaction(self, transaction_id: int):
         """Commit a transaction by updating its status to completed.
@@ -179,21 +209,25 @@ class TransactionDB:
         Returns:
             Transaction status information
         """
-        transaction = self.get_transaction(transaction_id)
-        if not transaction:
-            return {"status": "not_found"}
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT t.package_name, t.status, t.created_at, t.updated_at,
+                       (SELECT COUNT(*) FROM steps WHERE transaction_id = t.id),
+                       (SELECT COUNT(*) FROM snapshots WHERE transaction_id = t.id)
+                FROM transactions t WHERE t.id = ?
+            """, (transaction_id,)).fetchone()
         
-        steps = self.get_transaction_steps(transaction_id)
-        snapshots = self.get_transaction_snapshots(transaction_id)
+        if not row:
+            return {"status": "not_found"}
         
         return {
             "id": transaction_id,
-            "package_name": transaction["package_name"],
-            "status": transaction["status"],
-            "created_at": transaction["created_at"],
-            "updated_at": transaction["updated_at"],
-            "steps_count": len(steps),
-            "snapshots_count": len(snapshots)
+            "package_name": row[0],
+            "status": row[1],
+            "created_at": row[2],
+            "updated_at": row[3],
+            "steps_count": row[4],
+            "snapshots_count": row[5]
         }
 
     def get_transaction(self, transaction_id: int) -> Optional[Dict[str, Any]]:
@@ -205,8 +239,8 @@ class TransactionDB:
         Returns:
             Transaction data or None
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._lock:
+            cursor = self._conn.cursor()
             cursor.execute("""
                 SELECT id, package_name, metadata_hash, metadata, status, created_at, updated_at
                 FROM transactions WHERE id = ?
@@ -234,15 +268,15 @@ class TransactionDB:
         Returns:
             List of steps
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._lock:
+            cursor = self._conn.cursor()
             cursor.execute("""
                 SELECT id, step_order, step_type, step_data, status, created_at
                 FROM steps WHERE transaction_id = ? ORDER BY step_order
             """, (transaction_id,))
             
             steps = []
-            for row in cursor.fetchall():
+            for row in cursor:
                 steps.append({
                     "id": row[0],
                     "step_order": row[1],
@@ -262,15 +296,15 @@ class TransactionDB:
         Returns:
             List of snapshots
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._lock:
+            cursor = self._conn.cursor()
             cursor.execute("""
                 SELECT id, step_order, snapshot_data, created_at
                 FROM snapshots WHERE transaction_id = ? ORDER BY step_order
             """, (transaction_id,))
             
             snapshots = []
-            for row in cursor.fetchall():
+            for row in cursor:
                 snapshots.append({
                     "id": row[0],
                     "step_order": row[1],
@@ -288,23 +322,51 @@ class TransactionDB:
         Returns:
             List of transactions
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, package_name, status, created_at, updated_at
-                FROM transactions ORDER BY created_at DESC LIMIT ?
-            """, (limit,))
-            
-            transactions = []
-            for row in cursor.fetchall():
-                transactions.append({
-                    "id": row[0],
-                    "package_name": row[1],
-                    "status": row[2],
-                    "created_at": row[3],
-                    "updated_at": row[4]
-                })
-            return transactions
+        return [*self.iter_transactions(limit)]
+
+    def iter_transactions(self, limit: int = 50) -> Iterator[Dict[str, Any]]:
+        """Iterate over recent transactions, fetching rows as they are consumed.
+
+        Args:
+            limit: Maximum number of transactions to yield
+
+        Yields:
+            Transactions, newest first
+        """
+        query = """
+            SELECT id, package_name, status, created_at, updated_at
+            FROM transactions ORDER BY created_at DESC LIMIT ?
+        """
+        
+        if self.db_path == ":memory:":
+            # An in-memory database only exists on the shared connection
+            with self._lock:
+                rows = self._conn.execute(query, (limit,)).fetchall()
+            yield from map(self._transaction_summary, rows)
+            return
+        
+        # A connection of its own, so the shared one is not held while the
+        # caller consumes rows
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            yield from map(self._transaction_summary, conn.execute(query, (limit,)))
+
+    @staticmethod
+    def _transaction_summary(row: tuple) -> Dict[str, Any]:
+        """Build a transaction listing entry from a row.
+
+        Args:
+            row: id, package_name, status, created_at and updated_at
+
+        Returns:
+            Transaction summary
+        """
+        return {
+            "id": row[0],
+            "package_name": row[1],
+            "status": row[2],
+            "created_at": row[3],
+            "updated_at": row[4]
+        }
 
     def cleanup_old_transactions(self, days: int = 30) -> int:
         """Clean up old completed transactions.
@@ -315,14 +377,20 @@ class TransactionDB:
         Returns:
             Number of transactions deleted
         """
-        with sqlite3.connect(self.db_path) as conn:
+        # Steps and snapshots of the deleted transactions go in the same commit
+        expired = """
+            SELECT id FROM transactions
+            WHERE status IN ('completed', 'failed')
+            AND created_at < datetime('now', ?)
+        """
+        age = (f"-{int(days)} days",)
+        
+        with self._lock, self._conn as conn:
+            conn.execute("BEGIN IMMEDIATE")
             cursor = conn.cursor()
-            cursor.execute("""
-                DELETE FROM transactions 
-                WHERE status IN ('completed', 'failed') 
-                AND created_at < datetime('now', '-{} days')
-            """.format(days))
+            cursor.execute(f"DELETE FROM steps WHERE transaction_id IN ({expired})", age)
+            cursor.execute(f"DELETE FROM snapshots WHERE transaction_id IN ({expired})", age)
+            cursor.execute(f"DELETE FROM transactions WHERE id IN ({expired})", age)
             
             deleted_count = cursor.rowcount
-            conn.commit()
-            return deleted_count 
\ No newline at end of file
+            return deleted_count
@@ -0,0 +1,175 @@
+"""Tests for Ansible backend."""
+
+import os
+import tempfile
+import shutil
+import pytest
+from unittest.mock import Mock, patch
+
+from backends.ansible_backend import AnsibleBackend
+from core.exceptions import StepExecutionError
+
+
+class TestAnsibleBackend:
+    """Test cases for AnsibleBackend."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.playbook_dir = tempfile.mkdtemp()
+        self.runner_patcher = patch('backends.ansible_backend.ansible_runner')
+        self.mock_runner = self.runner_patcher.start()
+        self.mock_runner.Runner.return_value = Mock(rc=0, stats={"ok": {"localhost": 1}})
+        self.config = self.mock_runner.RunnerConfig.return_value
+
+        self.fact_cache_dir = os.path.join(self.playbook_dir, "fact-cache")
+        self.backend = AnsibleBackend(
+            playbook_dir=self.playbook_dir, fact_cache_dir=self.fact_cache_dir
+        )
+        self.backend.create_playbook("site", "- hosts: localhost\n  tasks: []\n")
+        self.backend.create_playbook("db", "- hosts: localhost\n  tasks: []\n")
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.runner_patcher.stop()
+        shutil.rmtree(self.playbook_dir, ignore_errors=True)
+
+    def test_runs_share_private_data_dir(self):
+        """Test that consecutive runs use one private data dir with fresh configs."""
+        self.backend.run_playbook("site.yml")
+        self.backend.run_playbook("db.yml", {"db_name": "demo"})
+
+        calls = self.mock_runner.RunnerConfig.call_args_list
+        assert len(calls) == 2
+        private_data_dir = calls[0][1]["private_data_dir"]
+        assert os.path.isdir(private_data_dir)
+        assert calls[1][1]["private_data_dir"] == private_data_dir
+        assert self.config.prepare.call_count == 2
+        assert calls[1][1]["playbook"] == os.path.join(self.playbook_dir, "db.yml")
+        assert calls[1][1]["extravars"] == {"db_name": "demo"}
+
+    def test_events_streamed_to_handler(self):
+        """Test that runner events are counted instead of buffered."""
+        def run():
+            handler = self.mock_runner.Runner.call_args[1]["event_handler"]
+            assert handler({"event": "runner_on_ok", "stdout": "ok: [localhost]"}) is False
+            assert handler({"event": "runner_on_skipped"}) is False
+            assert handler({"event": "playbook_on_stats"}) is True
+        self.mock_runner.Runner.return_value.run.side_effect = run
+
+        result = self.backend.run_playbook("site.yml")
+
+        assert "json_mode" not in self.mock_runner.RunnerConfig.call_args[1]
+        assert result["task_counts"] == {"ok": 1, "failed": 0, "skipped": 1, "unreachable": 0}
+
+    def test_run_playbook_failure_logs_event_output(self, caplog):
+        """Test that a failed run logs the output of its last events."""
+        def run():
+            handler = self.mock_runner.Runner.call_args[1]["event_handler"]
+            handler({"event": "runner_on_failed", "stdout": "fatal: [localhost]: FAILED!"})
+        self.mock_runner.Runner.return_value = Mock(rc=2)
+        self.mock_runner.Runner.return_value.run.side_effect = run
+
+        with pytest.raises(StepExecutionError):
+            self.backend.run_playbook("site.yml")
+
+        assert "fatal: [localhost]: FAILED!" in caplog.text
+
+    def test_run_playbook_failure(self):
+        """Test that a non-zero rc raises StepExecutionError."""
+        self.mock_runner.Runner.return_value = Mock(rc=2, stdout=None)
+
+        with pytest.raises(StepExecutionError):
+            self.backend.run_playbook("site.yml")
+
+    def test_fact_cache_enabled(self):
+        """Test that runs share a persistent jsonfile fact cache."""
+        self.backend.run_playbook("site.yml")
+
+        envvars = self.mock_runner.RunnerConfig.call_args[1]["envvars"]
+        assert envvars["ANSIBLE_CACHE_PLUGIN"] == "jsonfile"
+        assert envvars["ANSIBLE_GATHERING"] == "smart"
+        assert envvars["ANSIBLE_CACHE_PLUGIN_CONNECTION"] == self.fact_cache_dir
+        assert os.stat(self.fact_cache_dir).st_mode & 0o777 == 0o700
+
+    def test_fact_cache_dir_owned_by_other_user_refused(self):
+        """Test that a fact cache directory someone else owns is not used."""
+        with patch('backends.ansible_backend.os.geteuid', return_value=os.geteuid() + 1):
+            with pytest.raises(StepExecutionError, match="fact cache"):
+                self.backend.run_playbook("site.yml")
+
+        self.mock_runner.Runner.assert_not_called()
+
+    def test_fact_cache_dir_writable_by_others_refused(self):
+        """Test that a group- or world-writable fact cache directory is refused."""
+        os.makedirs(self.fact_cache_dir)
+        os.chmod(self.fact_cache_dir, 0o777)
+
+        with pytest.raises(StepExecutionError, match="fact cache"):
+            self.backend.run_playbook("site.yml")
+
+    def test_pipelining_enabled(self):
+        """Test that runs enable pipelining and persistent SSH connections."""
+        self.backend.run_playbook("site.yml")
+
+        envvars = self.mock_runner.RunnerConfig.call_args[1]["envvars"]
+        assert envvars["ANSIBLE_PIPELINING"] == "True"
+        assert int(envvars["ANSIBLE_FORKS"]) >= 4
+        assert "ControlPersist" in envvars["ANSIBLE_SSH_ARGS"]
+        # Host key checking and authentication stay as the user configured them
+        assert "ANSIBLE_HOST_KEY_CHECKING" not in envvars
+        assert "PreferredAuthentications" not in envvars["ANSIBLE_SSH_ARGS"]
+
+    def test_scratch_reset_between_runs(self):
+        """Test that state from a previous run does not leak into the next."""
+        private_data_dir = self.backend._private_data_dir
+        stale = os.path.join(private_data_dir, "inventory", "hosts")
+        os.makedirs(os.path.dirname(stale))
+        with open(stale, 'w') as f:
+            f.write("stale-host\n")
+        os.makedirs(os.path.join(private_data_dir, "artifacts", "old-run"))
+
+        self.backend.run_playbook("site.yml")
+
+        assert not os.path.exists(stale)
+        assert not os.path.exists(os.path.join(private_data_dir, "artifacts"))
+        assert os.path.isdir(os.path.join(private_data_dir, "project"))
+        # An empty inventory/ would shadow the default inventory
+        assert not os.path.exists(os.path.join(private_data_dir, "inventory"))
+
+    def test_list_playbooks(self):
+        """Test listing playbooks and picking up new ones."""
+        os.makedirs(os.path.join(self.playbook_dir, "roles.yml"))
+        with open(os.path.join(self.playbook_dir, "README.md"), 'w') as f:
+            f.write("notes\n")
+
+        assert sorted(self.backend.list_playbooks()) == ["db.yml", "site.yml"]
+
+        os.symlink(os.path.join(self.playbook_dir, "site.yml"),
+                   os.path.join(self.playbook_dir, "linked.yml"))
+        self.backend.create_playbook("web.yaml", "- hosts: all\n")
+        assert sorted(self.backend.list_playbooks()) == ["db.yml", "linked.yml", "site.yml", "web.yaml"]
+
+        self.backend.delete_playbook("db.yml")
+        assert sorted(self.backend.list_playbooks()) == ["linked.yml", "site.yml", "web.yaml"]
+
+    def test_validate_playbook(self):
+        """Test playbook validation for present and missing files."""
+        assert self.backend.validate_playbook("site.yml") is True
+        assert self.backend.validate_playbook("missing.yml") is False
+
+    def test_playbook_lookup_cached_until_write(self):
+        """Test that found playbooks are cached and misses are not."""
+        with patch('backends.ansible_backend.os.stat', wraps=os.stat) as mock_stat:
+            assert self.backend.validate_playbook("new.yml") is False
+
+            # Written behind the backend's back right after the miss
+            with open(os.path.join(self.playbook_dir, "new.yml"), 'w') as f:
+                f.write("- hosts: all\n")
+            assert self.backend.validate_playbook("new.yml") is True
+            assert self.backend.validate_playbook("new.yml") is True
+            assert mock_stat.call_count == 2
+
+            mock_stat.reset_mock()
+            info = self.backend.get_playbook_info("new.yml")
+            assert info["size"] == len("- hosts: all\n")
+            assert mock_stat.call_count == 0
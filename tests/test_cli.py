@@ -0,0 +1,37 @@
+"""Tests for CLI helpers."""
+
+import logging
+
+from cli.main import LOG_FORMAT, _CachedTimeFormatter
+
+
+class TestCachedTimeFormatter:
+    """Test cases for _CachedTimeFormatter."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.formatter = _CachedTimeFormatter(LOG_FORMAT)
+        self.reference = logging.Formatter(LOG_FORMAT)
+
+    def _record(self, created: float) -> logging.LogRecord:
+        """Build a record as if it had been emitted at ``created``."""
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "message", None, None)
+        record.created = created
+        record.msecs = (created - int(created)) * 1000
+        return record
+
+    def test_matches_logging_formatter(self):
+        """Test that cached timestamps equal the stock ones, milliseconds included."""
+        # Same second twice, then the next second, then back to an earlier one
+        for created in (1700000000.123, 1700000000.987, 1700000001.004, 1699999999.5):
+            record = self._record(created)
+
+            assert self.formatter.formatTime(record) == self.reference.formatTime(record)
+            assert self.formatter.format(record) == self.reference.format(record)
+
+    def test_datefmt_bypasses_cache(self):
+        """Test that an explicit date format is honoured."""
+        record = self._record(1700000000.123)
+
+        assert (self.formatter.formatTime(record, "%H:%M")
+                == self.reference.formatTime(record, "%H:%M"))
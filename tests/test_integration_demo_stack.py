@@ -15,67 +15,77 @@ from core.exceptions import TransactionError
 class TestDemoStackIntegration:
     """Integration test for demo stack installation."""
 
-    def setup_method(self):
-        """Set up test fixtures."""
+    # Demo stack metadata, read but never modified by the tests
+    demo_metadata = {
+        "package": {
+            "name": "demo-stack",
+            "version": "0.1"
+        },
+        "install_steps": [
+            {
+                "type": "apt_package",
+                "action": "install",
+                "packages": ["nginx"],
+                "rollback": "remove_packages"
+            },
+            {
+                "type": "file_copy",
+                "src": "./testsite/index.html",
+                "dest": "/var/www/testsite/index.html",
+                "rollback": "restore_original"
+            },
+            {
+                "type": "file_copy",
+                "src": "./testsite/nginx.conf",
+                "dest": "/etc/nginx/sites-enabled/testsite.conf",
+                "rollback": "restore_original"
+            },
+            {
+                "type": "custom_script",
+                "script": "create_db.sh",
+                "rollback_script": "delete_db.sh"
+            }
+        ]
+    }
+
+    @classmethod
+    def setup_class(cls):
+        """Create the read-only test files once for the whole class."""
         # Create temporary directories
-        self.temp_dir = tempfile.mkdtemp()
-        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
-        self.temp_db.close()
+        cls.temp_dir = tempfile.mkdtemp()
         
         # Create test files structure
-        self.testsite_dir = os.path.join(self.temp_dir, "testsite")
-        os.makedirs(self.testsite_dir, exist_ok=True)
+        cls.testsite_dir = os.path.join(cls.temp_dir, "testsite")
+        os.makedirs(cls.testsite_dir, exist_ok=True)
         
         # Create test files
-        self._create_test_files()
-        
-        # Initialize transaction manager
-        self.manager = TransactionManager(db_path=self.temp_db.name)
-        
-        # Demo stack metadata
-        self.demo_metadata = {
-            "package": {
-                "name": "demo-stack",
-                "version": "0.1"
-            },
-            "install_steps": [
-                {
-                    "type": "apt_package",
-                    "action": "install",
-                    "packages": ["nginx"],
-                    "rollback": "remove_packages"
-                },
-                {
-                    "type": "file_copy",
-                    "src": "./testsite/index.html",
-                    "dest": "/var/www/testsite/index.html",
-                    "rollback": "restore_original"
-                },
-                {
-                    "type": "file_copy",
-                    "src": "./testsite/nginx.conf",
-                    "dest": "/etc/nginx/sites-enabled/testsite.conf",
-                    "rollback": "restore_original"
-                },
-                {
-                    "type": "custom_script",
-                    "script": "create_db.sh",
-                    "rollback_script": "delete_db.sh"
-                }
-            ]
-        }
+        cls._create_test_files()
 
-    def teardown_method(self):
-        """Clean up test fixtures."""
-        # Remove temporary files
-        if os.path.exists(self.temp_db.name):
-            os.unlink(self.temp_db.name)
-        
+    @classmethod
+    def teardown_class(cls):
+        """Remove the test files."""
         # Remove temporary directory
-        if os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
+        if os.path.exists(cls.temp_dir):
+            shutil.rmtree(cls.temp_dir)
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        # Initialize transaction manager; no test reopens the database, so
+        # it can live in memory
+        self.manager = TransactionManager(db_path=":memory:")
+
+    @classmethod
+    def _write_file(cls, name, content, mode=0o644):
+        """Write a test file with a single write call and set its mode."""
+        fd = os.open(os.path.join(cls.testsite_dir, name), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        try:
+            os.write(fd, content.encode())
+            os.fchmod(fd, mode)
+        finally:
+            os.close(fd)
 
-    def _create_test_files(self):
+    @classmethod
+    def _create_test_files(cls):
         """Create test files for the demo stack."""
         # Create index.html
         index_html = """<!DOCTYPE html>
@@ -86,8 +96,7 @@ class TestDemoStackIntegration:
 </body>
 </html>"""
         
-        with open(os.path.join(self.testsite_dir, "index.html"), "w") as f:
-            f.write(index_html)
+        cls._write_file("index.html", index_html)
         
         # Create nginx.conf
         nginx_conf = """server {
@@ -97,8 +106,7 @@ class TestDemoStackIntegration:
     index index.html;
 }"""
         
-        with open(os.path.join(self.testsite_dir, "nginx.conf"), "w") as f:
-            f.write(nginx_conf)
+        cls._write_file("nginx.conf", nginx_conf)
         
         # Create create_db.sh
         create_db_script = """#!/bin/bash
@@ -106,22 +114,16 @@ mkdir -p /var/www/testsite
 sqlite3 /var/www/testsite/site.db "CREATE TABLE demo(id INTEGER PRIMARY KEY, val TEXT);"
 """
         
-        with open(os.path.join(self.testsite_dir, "create_db.sh"), "w") as f:
-            f.write(create_db_script)
-        
-        # Make script executable
-        os.chmod(os.path.join(self.testsite_dir, "create_db.sh"), 0o755)
+        # Executable script
+        cls._write_file("create_db.sh", create_db_script, 0o755)
         
         # Create delete_db.sh
         delete_db_script = """#!/bin/bash
 rm -f /var/www/testsite/site.db
 """
         
-        with open(os.path.join(self.testsite_dir, "delete_db.sh"), "w") as f:
-            f.write(delete_db_script)
-        
-        # Make script executable
-        os.chmod(os.path.join(self.testsite_dir, "delete_db.sh"), 0o755)
+        # Executable script
+        cls._write_file("delete_db.sh", delete_db_script, 0o755)
 
     @patch('backends.step_executor.StepExecutor.execute_step')
     def test_demo_stack_installation_success(self, mock_execute_step):
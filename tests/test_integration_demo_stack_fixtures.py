@@ -1,7 +1,8 @@
 """Integration test for demo stack using fixture files."""
 
+import copy
+import functools
 import pytest
-import tempfile
 import os
 import shutil
 import yaml
@@ -12,35 +13,36 @@ from core.transaction_manager import TransactionManager
 from core.exceptions import TransactionError
 
 
+# libyaml-backed loader when PyYAML was built with it
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_demo_metadata(path: str) -> dict:
+    """Load fixture metadata once per test session; callers copy the result."""
+    with open(path, "r") as f:
+        return yaml.load(f, Loader=SafeLoader)
+
+
 class TestDemoStackFixturesIntegration:
     """Integration test for demo stack using fixture files."""
 
     def setup_method(self):
         """Set up test fixtures."""
-        # Create temporary directories
-        self.temp_dir = tempfile.mkdtemp()
-        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
-        self.temp_db.close()
-        
         # Path to fixture files
         self.fixture_dir = Path(__file__).parent / "fixtures" / "demo-stack"
         
-        # Initialize transaction manager
-        self.manager = TransactionManager(db_path=self.temp_db.name)
+        # Transaction manager, created only by tests that install
+        self.manager = None
         
-        # Load metadata from fixture file
-        with open(self.fixture_dir / "metadata.yaml", "r") as f:
-            self.demo_metadata = yaml.safe_load(f)
+        # Load metadata from fixture file, parsed once and copied per test
+        self.demo_metadata = copy.deepcopy(_load_demo_metadata(str(self.fixture_dir / "metadata.yaml")))
 
     def teardown_method(self):
         """Clean up test fixtures."""
-        # Remove temporary files
-        if os.path.exists(self.temp_db.name):
-            os.unlink(self.temp_db.name)
-        
-        # Remove temporary directory
-        if os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
+        # Remove the manager's snapshot directory
+        if self.manager is not None:
+            shutil.rmtree(self.manager.state_tracker.snapshot_dir, ignore_errors=True)
 
     def test_fixture_files_exist(self):
         """Test that all fixture files exist and are accessible."""
@@ -51,11 +53,9 @@ class TestDemoStackFixturesIntegration:
         testsite_dir = self.fixture_dir / "testsite"
         assert testsite_dir.exists()
         
-        # Check individual files
-        assert (testsite_dir / "index.html").exists()
-        assert (testsite_dir / "nginx.conf").exists()
-        assert (testsite_dir / "create_db.sh").exists()
-        assert (testsite_dir / "delete_db.sh").exists()
+        # Check individual files with one directory listing
+        files = {entry.name for entry in os.scandir(testsite_dir) if entry.is_file()}
+        assert {"index.html", "nginx.conf", "create_db.sh", "delete_db.sh"} <= files
 
     def test_fixture_metadata_structure(self):
         """Test that fixture metadata has correct structure."""
@@ -80,30 +80,26 @@ class TestDemoStackFixturesIntegration:
         testsite_dir = self.fixture_dir / "testsite"
         
         # Test index.html content
-        with open(testsite_dir / "index.html", "r") as f:
-            content = f.read()
+        content = (testsite_dir / "index.html").read_text()
         
         assert "<title>Demo App</title>" in content
         assert "<h1>It works!</h1>" in content
         
         # Test nginx.conf content
-        with open(testsite_dir / "nginx.conf", "r") as f:
-            content = f.read()
+        content = (testsite_dir / "nginx.conf").read_text()
         
         assert "listen 80" in content
         assert "root /var/www/testsite" in content
         assert "index index.html" in content
         
         # Test create_db.sh content
-        with open(testsite_dir / "create_db.sh", "r") as f:
-            content = f.read()
+        content = (testsite_dir / "create_db.sh").read_text()
         
         assert "mkdir -p /var/www/testsite" in content
         assert "CREATE TABLE demo" in content
         
         # Test delete_db.sh content
-        with open(testsite_dir / "delete_db.sh", "r") as f:
-            content = f.read()
+        content = (testsite_dir / "delete_db.sh").read_text()
         
         assert "rm -f /var/www/testsite/site.db" in content
 
@@ -123,6 +119,10 @@ class TestDemoStackFixturesIntegration:
         # Mock successful step execution
         mock_execute_step.return_value = {"success": True, "message": "Step completed"}
         
+        # Initialize transaction manager; the database only needs to live
+        # as long as the test, so it is kept in memory
+        self.manager = TransactionManager(db_path=":memory:")
+        
         # Begin transaction
         transaction_id = self.manager.begin_transaction(
             package_name="demo-stack",
@@ -138,29 +138,20 @@ class TestDemoStackFixturesIntegration:
         assert mock_execute_step.call_count == 4
         
         # Check that steps were called with correct data
-        calls = mock_execute_step.call_args_list
-        
-        # First step: apt_package
-        assert calls[0][0][0]["type"] == "apt_package"
-        assert calls[0][0][0]["packages"] == ["nginx"]
-        assert calls[0][0][0]["rollback"] == "remove_packages"
-        
-        # Second step: file_copy (index.html)
-        assert calls[1][0][0]["type"] == "file_copy"
-        assert calls[1][0][0]["src"] == "./testsite/index.html"
-        assert calls[1][0][0]["dest"] == "/var/www/testsite/index.html"
-        assert calls[1][0][0]["rollback"] == "restore_original"
-        
-        # Third step: file_copy (nginx.conf)
-        assert calls[2][0][0]["type"] == "file_copy"
-        assert calls[2][0][0]["src"] == "./testsite/nginx.conf"
-        assert calls[2][0][0]["dest"] == "/etc/nginx/sites-enabled/testsite.conf"
-        assert calls[2][0][0]["rollback"] == "restore_original"
-        
-        # Fourth step: custom_script
-        assert calls[3][0][0]["type"] == "custom_script"
-        assert calls[3][0][0]["script"] == "create_db.sh"
-        assert calls[3][0][0]["rollback_script"] == "delete_db.sh"
+        expected = [
+            {"type": "apt_package", "packages": ["nginx"], "rollback": "remove_packages"},
+            {"type": "file_copy", "src": "./testsite/index.html",
+             "dest": "/var/www/testsite/index.html", "rollback": "restore_original"},
+            {"type": "file_copy", "src": "./testsite/nginx.conf",
+             "dest": "/etc/nginx/sites-enabled/testsite.conf", "rollback": "restore_original"},
+            {"type": "custom_script", "script": "create_db.sh", "rollback_script": "delete_db.sh"}
+        ]
+        
+        assert len(mock_execute_step.call_args_list) == len(expected)
+        assert [
+            {key: call[0][0].get(key) for key in fields}
+            for call, fields in zip(mock_execute_step.call_args_list, expected)
+        ] == expected
         
         # Commit transaction
         self.manager.commit_transaction()
@@ -175,7 +166,7 @@ class TestDemoStackFixturesIntegration:
         metadata_file = self.fixture_dir / "metadata.yaml"
         
         with open(metadata_file, "r") as f:
-            parsed_metadata = yaml.safe_load(f)
+            parsed_metadata = yaml.load(f, Loader=SafeLoader)
         
         # Verify structure
         assert isinstance(parsed_metadata, dict)
@@ -199,15 +190,16 @@ class TestDemoStackFixturesIntegration:
 
     def test_rollback_configurations(self):
         """Test that all steps have proper rollback configurations."""
-        steps = self.demo_metadata["install_steps"]
+        expected = [
+            ("apt_package", "rollback", "remove_packages"),
+            ("file_copy", "rollback", "restore_original"),
+            ("file_copy", "rollback", "restore_original"),
+            ("custom_script", "rollback_script", "delete_db.sh")
+        ]
         
-        for step in steps:
-            if step["type"] == "apt_package":
-                assert "rollback" in step
-                assert step["rollback"] == "remove_packages"
-            elif step["type"] == "file_copy":
-                assert "rollback" in step
-                assert step["rollback"] == "restore_original"
-            elif step["type"] == "custom_script":
-                assert "rollback_script" in step
-                assert step["rollback_script"] == "delete_db.sh" 
\ No newline at end of file
+        steps = self.demo_metadata["install_steps"]
+        assert len(steps) == len(expected)
+        assert [
+            (step["type"], key, step.get(key))
+            for step, (_, key, _) in zip(steps, expected)
+        ] == expected 
\ No newline at end of file
@@ -1,14 +1,22 @@
 """Tests for metadata parser."""
 
 import pytest
-import tempfile
 import os
+import json
+import jsonschema
+import yaml
 from pathlib import Path
+from unittest.mock import patch
 
-from metadata.metadata_parser import MetadataParser
+from metadata.metadata_parser import MetadataParser, get_parser
+from metadata.package_schema import STEP_SCHEMA
 from core.exceptions import MetadataError, ValidationError
 
 
+# libyaml-backed dumper when PyYAML was built with it
+SafeDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
 class TestMetadataParser:
     """Test cases for MetadataParser."""
 
@@ -54,6 +62,25 @@ class TestMetadataParser:
         assert len(metadata["install_steps"]) == 1
         assert metadata["install_steps"][0]["type"] == "apt_package"
 
+    def test_parse_json_metadata(self):
+        """Test that JSON content is parsed without going through YAML."""
+        content = json.dumps(self.valid_metadata)
+
+        with patch('metadata.metadata_parser.yaml.load') as mock_load:
+            metadata = self.parser.parse_string(content)
+
+        mock_load.assert_not_called()
+        assert metadata == self.valid_metadata
+
+    def test_parse_flow_style_yaml_metadata(self):
+        """Test that brace-delimited YAML that is not JSON still parses."""
+        content = ("{package: {name: test-package, version: 1.0.0}, install_steps: "
+                   "[{type: apt_package, action: install, packages: [nginx]}]}")
+
+        metadata = self.parser.parse_string(content)
+
+        assert metadata["package"]["name"] == "test-package"
+
     def test_parse_invalid_metadata(self):
         """Test parsing invalid metadata."""
         invalid_metadata = {
@@ -66,23 +93,58 @@ class TestMetadataParser:
         with pytest.raises(MetadataError):
             self.parser.parse_string(self._metadata_to_yaml(invalid_metadata))
 
-    def test_parse_file(self):
+    def test_parse_file(self, tmp_path):
         """Test parsing metadata from file."""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yml', delete=False) as f:
-            f.write(self._metadata_to_yaml(self.valid_metadata))
-            temp_file = f.name
+        temp_file = tmp_path / "package.yml"
+        temp_file.write_text(self._metadata_to_yaml(self.valid_metadata))
         
-        try:
-            metadata = self.parser.parse_file(temp_file)
-            assert metadata["package"]["name"] == "test-package"
-        finally:
-            os.unlink(temp_file)
+        metadata = self.parser.parse_file(str(temp_file))
+        assert metadata["package"]["name"] == "test-package"
 
     def test_parse_nonexistent_file(self):
         """Test parsing nonexistent file."""
         with pytest.raises(MetadataError):
             self.parser.parse_file("/nonexistent/file.yml")
 
+    def test_parse_stream(self, tmp_path):
+        """Test that every document of a YAML bundle is parsed and validated."""
+        second = dict(self.valid_metadata, package={"name": "second", "version": "2.0.0"})
+        bundle = tmp_path / "bundle.yml"
+        bundle.write_text(yaml.dump_all([self.valid_metadata, second], Dumper=SafeDumper))
+
+        names = [metadata["package"]["name"] for metadata in self.parser.parse_stream(str(bundle))]
+
+        assert names == ["test-package", "second"]
+
+        bundle.write_text(yaml.dump_all([self.valid_metadata, {"package": {"name": "bad"}}], Dumper=SafeDumper))
+        documents = self.parser.parse_stream(str(bundle))
+
+        assert next(documents)["package"]["name"] == "test-package"
+        with pytest.raises(MetadataError):
+            next(documents)
+
+    def test_parse_file_cached_until_modified(self, tmp_path):
+        """Test that an unchanged file is not parsed again."""
+        path = tmp_path / "package.yml"
+        path.write_text(self._metadata_to_yaml(self.valid_metadata))
+
+        with patch('metadata.metadata_parser.yaml.load', wraps=yaml.load) as mock_load:
+            first = self.parser.parse_file(str(path))
+            first["package"]["name"] = "mutated"
+            second = self.parser.parse_file(str(path))
+            assert mock_load.call_count == 1
+            assert second["package"]["name"] == "test-package"
+
+            self.valid_metadata["package"]["version"] = "1.0.1"
+            path.write_text(self._metadata_to_yaml(self.valid_metadata))
+            os.utime(path, ns=(1, 1))
+            assert self.parser.parse_file(str(path))["package"]["version"] == "1.0.1"
+            assert mock_load.call_count == 2
+
+    def test_get_parser_shared(self):
+        """Test that the CLI parser is created once per process."""
+        assert get_parser() is get_parser()
+
     def test_get_package_info(self):
         """Test extracting package info."""
         package_info = self.parser.get_package_info(self.valid_metadata)
@@ -99,6 +161,37 @@ class TestMetadataParser:
         assert steps[0]["type"] == "apt_package"
         assert steps[0]["action"] == "install"
 
+    def test_get_install_steps_invalid_step(self):
+        """Test that an invalid step anywhere in the list is reported."""
+        metadata = dict(self.valid_metadata, install_steps=[
+            {"type": "apt_package", "action": "install", "packages": ["nginx"]},
+            {"type": "user_management", "action": "create"}
+        ])
+
+        with pytest.raises(ValidationError, match="username"):
+            self.parser.get_install_steps(metadata)
+
+    def test_parse_all(self):
+        """Test extracting every package component in one call."""
+        package = self.parser.parse_all(self.valid_metadata)
+
+        assert package.info["name"] == "test-package"
+        assert package.install_steps[0]["packages"] == ["nginx"]
+        assert package.dependencies == []
+        assert package.requirements["min_memory"] == 512
+
+    def test_parse_all_validated_skips_validation(self):
+        """Test that already validated metadata is not validated twice."""
+        metadata = self.valid_metadata
+        self.parser.validate_metadata(metadata)
+
+        with patch('metadata.metadata_parser._validate') as mock_validate:
+            package = self.parser.parse_all(metadata, validated=True)
+
+        mock_validate.assert_not_called()
+        assert package.info["name"] == "test-package"
+        assert package.install_steps[0]["packages"] == ["nginx"]
+
     def test_validate_step(self):
         """Test step validation."""
         valid_step = {
@@ -117,6 +210,42 @@ class TestMetadataParser:
         with pytest.raises(ValidationError):
             self.parser.validate_step(invalid_step)
 
+    def test_validate_step_type_fields(self):
+        """Test that steps are checked against the schema of their type."""
+        with pytest.raises(ValidationError, match="packages"):
+            self.parser.validate_step({"type": "apt_package", "action": "install"})
+
+        with pytest.raises(ValidationError, match="mode"):
+            self.parser.validate_step(
+                {"type": "file_copy", "src": "a", "dest": "b", "mode": "rwx"}
+            )
+
+        metadata = {
+            "package": {"name": "test-package", "version": "1.0.0"},
+            "install_steps": [
+                {"type": "file_copy", "src": "a", "dest": "b"},
+                {"type": "systemd_service", "service": "nginx", "action": "reload"}
+            ]
+        }
+        with pytest.raises(ValidationError, match="reload"):
+            self.parser.validate_metadata(metadata)
+
+    def test_step_schema_checks_type_fields(self):
+        """Test that the public step schema includes the type-specific rules."""
+        jsonschema.validate(
+            {"type": "apt_package", "action": "install", "packages": ["nginx"]}, STEP_SCHEMA
+        )
+
+        with pytest.raises(jsonschema.ValidationError, match="packages"):
+            jsonschema.validate({"type": "apt_package", "action": "install"}, STEP_SCHEMA)
+
+    def test_validate_package_info_pattern(self):
+        """Test that schema patterns are enforced by the precompiled matcher."""
+        self.parser.validate_package_info({"name": "my_app-2", "version": "1.2.3-rc.1"})
+
+        with pytest.raises(ValidationError, match="does not match"):
+            self.parser.validate_package_info({"name": "my app", "version": "1.0.0"})
+
     def test_create_metadata_template(self):
         """Test creating metadata template."""
         template = self.parser.create_metadata_template("test-package", "1.0.0")
@@ -126,18 +255,17 @@ class TestMetadataParser:
         assert "install_steps" in template
         assert "requirements" in template
 
-    def test_save_metadata(self):
+    def test_save_metadata(self, tmp_path):
         """Test saving metadata to file."""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            file_path = os.path.join(temp_dir, "test_metadata.yml")
-            
-            self.parser.save_metadata(self.valid_metadata, file_path)
-            
-            assert os.path.exists(file_path)
-            
-            # Verify saved content
-            loaded_metadata = self.parser.parse_file(file_path)
-            assert loaded_metadata["package"]["name"] == "test-package"
+        file_path = str(tmp_path / "test_metadata.yml")
+        
+        self.parser.save_metadata(self.valid_metadata, file_path)
+        
+        assert os.path.exists(file_path)
+        
+        # Verify saved content
+        loaded_metadata = self.parser.parse_file(file_path)
+        assert loaded_metadata["package"]["name"] == "test-package"
 
     def test_merge_metadata(self):
         """Test merging metadata."""
@@ -150,7 +278,8 @@ class TestMetadataParser:
         override_metadata = {
             "package": {"version": "2.0.0"},
             "install_steps": [{"type": "apt_package", "action": "install", "packages": ["override"]}],
-            "dependencies": ["override-dep"]
+            "dependencies": ["override-dep"],
+            "conflicts": ["apache2"]
         }
         
         merged = self.parser.merge_metadata(base_metadata, override_metadata)
@@ -159,8 +288,14 @@ class TestMetadataParser:
         assert merged["package"]["version"] == "2.0.0"
         assert len(merged["install_steps"]) == 2
         assert len(merged["dependencies"]) == 2
+        assert merged["conflicts"] == ["apache2"]
+        
+        # The base metadata is left untouched
+        merged["install_steps"][0]["packages"].append("extra")
+        assert base_metadata["package"]["version"] == "1.0.0"
+        assert base_metadata["install_steps"][0]["packages"] == ["base"]
+        assert base_metadata["dependencies"] == ["base-dep"]
 
     def _metadata_to_yaml(self, metadata):
         """Convert metadata dict to YAML string."""
-        import yaml
-        return yaml.dump(metadata, default_flow_style=False) 
\ No newline at end of file
+        return yaml.dump(metadata, Dumper=SafeDumper, default_flow_style=False) 
\ No newline at end of file
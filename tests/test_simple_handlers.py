@@ -0,0 +1,345 @@
+"""Tests for simple handlers."""
+
+import errno
+import os
+import shutil
+import stat
+import subprocess
+import pytest
+from unittest.mock import Mock, patch
+
+from backends.simple_handlers import (
+    OUTPUT_TAIL_LINES, SimpleHandlers, fast_copy, run_command
+)
+from core.exceptions import StepExecutionError
+
+
+class TestSimpleHandlers:
+    """Test cases for SimpleHandlers."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        # Exercise the apt-get path unless a test opts into python-apt
+        self.apt_patcher = patch('backends.simple_handlers.apt', None)
+        self.apt_patcher.start()
+        # Service state queries report nothing known unless a test says otherwise
+        self.show_patcher = patch(
+            'backends.simple_handlers.subprocess.run',
+            return_value=Mock(stdout="", stderr="")
+        )
+        self.mock_show = self.show_patcher.start()
+        self.handlers = SimpleHandlers()
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.show_patcher.stop()
+        self.apt_patcher.stop()
+
+    @patch('backends.simple_handlers.os.path.getmtime', return_value=0)
+    @patch('backends.simple_handlers.run_command')
+    def test_install_packages_without_transaction(self, mock_run, mock_getmtime):
+        """Test that a standalone install runs apt immediately."""
+        mock_run.return_value = Mock(stdout="", stderr="")
+
+        result = self.handlers.install_packages(["nginx"])
+
+        assert result["success"] is True
+        assert result["packages"] == ["nginx"]
+        commands = [call[0][0] for call in mock_run.call_args_list]
+        assert commands == [
+            ("apt-get", "update"),
+            ("apt-get", "install", "-y", "nginx")
+        ]
+
+    @patch('backends.simple_handlers.os.path.getmtime', return_value=0)
+    @patch('backends.simple_handlers.run_command')
+    def test_package_transaction_batches_operations(self, mock_run, mock_getmtime):
+        """Test that queued operations are flushed with one apt run."""
+        mock_run.return_value = Mock(stdout="", stderr="")
+
+        with self.handlers.package_transaction() as handlers:
+            assert handlers.install_packages(["nginx"])["queued"] is True
+            handlers.install_packages(["sqlite3"])
+            handlers.remove_packages(["apache2"])
+            handlers.update_packages(["openssl"])
+            mock_run.assert_not_called()
+
+        commands = [call[0][0] for call in mock_run.call_args_list]
+        assert commands == [
+            ("apt-get", "update"),
+            ("apt-get", "install", "-y", "nginx", "sqlite3", "apache2-"),
+            ("apt-get", "upgrade", "-y", "openssl")
+        ]
+        for call in mock_run.call_args_list:
+            assert call[1]["env"]["DEBIAN_FRONTEND"] == "noninteractive"
+
+    @patch('backends.simple_handlers.run_command')
+    def test_package_transaction_rejects_conflicting_operations(self, mock_run):
+        """Test that one package cannot be queued for two operations."""
+        with pytest.raises(StepExecutionError, match="nginx"):
+            with self.handlers.package_transaction() as handlers:
+                handlers.remove_packages(["nginx"])
+                handlers.install_packages(["curl", "nginx"])
+
+        mock_run.assert_not_called()
+        assert not self.handlers._pending_remove
+
+    @patch('backends.simple_handlers.run_command')
+    def test_package_transaction_discarded_on_error(self, mock_run):
+        """Test that queued operations are dropped when the block fails."""
+        with pytest.raises(RuntimeError):
+            with self.handlers.package_transaction() as handlers:
+                handlers.install_packages(["nginx"])
+                raise RuntimeError("step failed")
+
+        mock_run.assert_not_called()
+        assert self.handlers.flush()["installed"] == []
+
+    @patch('backends.simple_handlers.time.time', return_value=1000.0)
+    @patch('backends.simple_handlers.os.path.getmtime', return_value=900.0)
+    @patch('backends.simple_handlers.run_command')
+    def test_apt_update_skipped_for_fresh_lists(self, mock_run, mock_getmtime, mock_time):
+        """Test that fresh package lists are not refreshed again."""
+        mock_run.return_value = Mock(stdout="", stderr="")
+
+        self.handlers.install_packages(["nginx"])
+
+        commands = [call[0][0] for call in mock_run.call_args_list]
+        assert ("apt-get", "update") not in commands
+
+    @patch('backends.simple_handlers.os.path.getmtime', return_value=0)
+    @patch('backends.simple_handlers.run_command')
+    def test_flush_failure_raises(self, mock_run, mock_getmtime):
+        """Test that apt failures surface as StepExecutionError."""
+        mock_run.side_effect = subprocess.CalledProcessError(
+            100, ["apt-get"], stderr="E: Unable to locate package"
+        )
+
+        with pytest.raises(StepExecutionError):
+            self.handlers.install_packages(["missing-package"])
+
+    @patch('backends.simple_handlers.os.path.getmtime', return_value=0)
+    @patch('backends.simple_handlers.run_command')
+    def test_package_transaction_uses_python_apt(self, mock_run, mock_getmtime):
+        """Test that python-apt commits all marks with one cache commit."""
+        mock_apt = Mock()
+        cache = mock_apt.Cache.return_value
+        packages = {"nginx": Mock(), "apache2": Mock(is_installed=True)}
+        cache.__getitem__ = Mock(side_effect=packages.__getitem__)
+
+        with patch('backends.simple_handlers.apt', mock_apt):
+            with self.handlers.package_transaction() as handlers:
+                handlers.install_packages(["nginx"])
+                handlers.remove_packages(["apache2"])
+
+        mock_run.assert_not_called()
+        mock_apt.Cache.assert_called_once()
+        cache.update.assert_called_once()
+        packages["nginx"].mark_install.assert_called_once()
+        packages["apache2"].mark_delete.assert_called_once_with(purge=False)
+        cache.commit.assert_called_once()
+
+    @patch('backends.simple_handlers.os.path.getmtime', return_value=0)
+    @patch('backends.simple_handlers.run_command')
+    def test_python_apt_marks_dropped_on_failure(self, mock_run, mock_getmtime):
+        """Test that marks of a failed flush are not committed by the next one."""
+        mock_apt = Mock()
+        first, second = Mock(), Mock()
+        mock_apt.Cache.side_effect = [first, second]
+        nginx = Mock()
+        first.__getitem__ = Mock(side_effect={"nginx": nginx}.__getitem__)
+        second.__getitem__ = Mock(return_value=Mock())
+
+        with patch('backends.simple_handlers.apt', mock_apt):
+            with pytest.raises(StepExecutionError, match="unknown package"):
+                with self.handlers.package_transaction() as handlers:
+                    handlers.install_packages(["nginx", "nonexistent"])
+
+            self.handlers.install_packages(["curl"])
+
+        nginx.mark_install.assert_called_once()
+        first.commit.assert_not_called()
+        second.commit.assert_called_once()
+
+    @patch('backends.simple_handlers.run_command')
+    def test_start_service_keeps_single_result_shape(self, mock_run):
+        """Test that the singular wrapper reports a single service."""
+        mock_run.return_value = Mock(stdout="", stderr="")
+
+        result = self.handlers.start_service("nginx")
+
+        assert result["service"] == "nginx"
+        assert result["action"] == "start"
+
+    def test_copy_file_preserves_content_and_mode(self, tmp_path):
+        """Test that copy_file copies data and metadata."""
+        src = tmp_path / "src.conf"
+        src.write_bytes(b"listen 80;\n" * 1000)
+        os.chmod(src, 0o640)
+        dest = tmp_path / "nested" / "dest.conf"
+
+        result = self.handlers.copy_file(str(src), str(dest))
+
+        assert result["success"] is True
+        assert dest.read_bytes() == src.read_bytes()
+        assert os.stat(dest).st_mode & 0o777 == 0o640
+
+    def test_fast_copy_prefers_reflink(self, tmp_path):
+        """Test that a reflink clone is used before any data copy."""
+        src = tmp_path / "src.bin"
+        src.write_bytes(os.urandom(4096))
+        dest = tmp_path / "dest.bin"
+
+        with patch('backends.simple_handlers.fcntl.ioctl') as mock_ioctl, \
+                patch('backends.simple_handlers.os.copy_file_range',
+                      side_effect=AssertionError("data copied"), create=True):
+            fast_copy(str(src), str(dest))
+
+        mock_ioctl.assert_called_once()
+        assert mock_ioctl.call_args[0][1] == 0x40049409
+
+    def test_fast_copy_falls_back_without_kernel_copy(self, tmp_path):
+        """Test the userspace fallback when kernel copy is unavailable."""
+        src = tmp_path / "src.bin"
+        src.write_bytes(os.urandom(4096))
+        dest = tmp_path / "dest.bin"
+        unsupported = OSError(errno.ENOSYS, "not supported")
+
+        with patch('backends.simple_handlers.fcntl.ioctl', side_effect=unsupported), \
+                patch('backends.simple_handlers.os.copy_file_range',
+                      side_effect=unsupported, create=True), \
+                patch('backends.simple_handlers.os.sendfile', side_effect=unsupported):
+            fast_copy(str(src), str(dest))
+
+        assert dest.read_bytes() == src.read_bytes()
+
+    def test_fast_copy_falls_back_on_premature_eof(self, tmp_path):
+        """Test that a kernel copy reporting EOF at once is not trusted."""
+        src = tmp_path / "src.bin"
+        src.write_bytes(os.urandom(4096))
+        dest = tmp_path / "dest.bin"
+
+        with patch('backends.simple_handlers.fcntl.ioctl',
+                   side_effect=OSError(errno.EOPNOTSUPP, "not supported")), \
+                patch('backends.simple_handlers.os.copy_file_range',
+                      return_value=0, create=True):
+            fast_copy(str(src), str(dest))
+
+        assert dest.read_bytes() == src.read_bytes()
+
+    def test_fast_copy_falls_back_for_zero_size_stat(self, tmp_path):
+        """Test that a file stat'ed as empty, as in procfs, keeps its content."""
+        src = tmp_path / "src.txt"
+        src.write_text("cpu0 1 2 3\n")
+        dest = tmp_path / "dest.txt"
+        real_fstat = os.fstat
+
+        def empty_fstat(fd):
+            result = list(real_fstat(fd))
+            result[stat.ST_SIZE] = 0
+            return os.stat_result(result)
+
+        with patch('backends.simple_handlers.fcntl.ioctl',
+                   side_effect=OSError(errno.EOPNOTSUPP, "not supported")), \
+                patch('backends.simple_handlers.os.copy_file_range',
+                      return_value=0, create=True), \
+                patch('backends.simple_handlers.os.fstat', side_effect=empty_fstat):
+            fast_copy(str(src), str(dest))
+
+        assert dest.read_text() == "cpu0 1 2 3\n"
+
+    def test_fast_copy_refuses_same_file(self, tmp_path):
+        """Test that copying a file onto itself fails instead of truncating it."""
+        src = tmp_path / "src.conf"
+        src.write_text("data")
+        os.link(src, tmp_path / "hardlink.conf")
+        os.symlink(src, tmp_path / "symlink.conf")
+
+        for dest in ("src.conf", "hardlink.conf", "symlink.conf", "."):
+            with pytest.raises(shutil.SameFileError):
+                fast_copy(str(src), str(tmp_path / dest))
+
+        assert src.read_text() == "data"
+
+    def test_run_command_keeps_output_tail(self):
+        """Test that only the tail of a long output is retained."""
+        result = run_command(["sh", "-c", "seq 1 500; echo warning >&2"])
+
+        lines = result.stdout.splitlines()
+        assert len(lines) == OUTPUT_TAIL_LINES
+        assert lines[-1] == "500"
+        assert result.stderr == "warning\n"
+
+    def test_run_command_failure(self):
+        """Test that a non-zero exit raises with the stderr tail."""
+        with pytest.raises(subprocess.CalledProcessError) as exc_info:
+            run_command(["sh", "-c", "echo broken >&2; exit 3"])
+
+        assert exc_info.value.returncode == 3
+        assert exc_info.value.stderr == "broken\n"
+
+    @patch('backends.simple_handlers.run_command')
+    def test_create_user_uses_useradd(self, mock_run):
+        """Test that a single user is created by useradd, without a home directory."""
+        mock_run.return_value = Mock(stdout="", stderr="")
+
+        result = self.handlers.create_user("svc", {"shell": "/bin/false", "system": True})
+
+        assert result["username"] == "svc"
+        mock_run.assert_called_once_with(["useradd", "-s", "/bin/false", "-r", "svc"])
+
+    def test_run_command_does_not_leak_fds(self, tmp_path):
+        """Test that descriptors opened by Python are not inherited."""
+        with open(tmp_path / "held.txt", 'w') as held:
+            # A high number cannot collide with the fd ls opens for the listing
+            fd = os.dup2(held.fileno(), 200, inheritable=False)
+            try:
+                result = run_command(["ls", "/proc/self/fd"])
+            finally:
+                os.close(fd)
+
+        assert "200" not in result.stdout.split()
+
+    def test_copy_file_ensures_directory_once(self, tmp_path):
+        """Test that the destination directory is created only once."""
+        src = tmp_path / "src.txt"
+        src.write_text("data")
+        dest_dir = tmp_path / "out"
+
+        with patch('backends.simple_handlers.os.makedirs', wraps=os.makedirs) as mock_makedirs:
+            self.handlers.copy_file(str(src), str(dest_dir / "a.txt"))
+            self.handlers.copy_file(str(src), str(dest_dir / "b.txt"))
+
+        assert mock_makedirs.call_count == 1
+        assert (dest_dir / "b.txt").read_text() == "data"
+
+    @patch('backends.simple_handlers.run_command')
+    def test_services_skip_units_in_target_state(self, mock_run):
+        """Test that already-correct units are not touched."""
+        mock_run.return_value = Mock(stdout="", stderr="")
+        self.mock_show.side_effect = [
+            Mock(stdout="ActiveState=active\nUnitFileState=enabled\n"),
+            Mock(stdout="ActiveState=inactive\nUnitFileState=disabled\n")
+        ]
+
+        assert self.handlers.enable_service("nginx")["skipped"] is True
+        assert self.handlers.enable_service("redis")["skipped"] is False
+        mock_run.assert_called_once()
+        assert mock_run.call_args[0][0] == ["systemctl", "enable", "redis"]
+
+        assert self.mock_show.call_count == 2
+
+    @patch('backends.simple_handlers.run_command')
+    def test_service_state_queried_fresh(self, mock_run):
+        """Test that a unit changed by something else is not skipped from stale state."""
+        mock_run.return_value = Mock(stdout="", stderr="")
+        self.mock_show.side_effect = [
+            Mock(stdout="ActiveState=inactive\nUnitFileState=disabled\n"),
+            # Started by a package script after the first query
+            Mock(stdout="ActiveState=active\nUnitFileState=disabled\n")
+        ]
+
+        assert self.handlers.stop_service("nginx")["skipped"] is True
+        assert self.handlers.stop_service("nginx")["skipped"] is False
+        mock_run.assert_called_once()
+        assert mock_run.call_args[0][0] == ["systemctl", "stop", "nginx"]
@@ -0,0 +1,117 @@
+"""Tests for state tracker."""
+
+import shutil
+import tempfile
+from unittest.mock import Mock, patch
+
+from core.state_tracker import StateTracker
+
+
+class TestStateTracker:
+    """Test cases for StateTracker."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.tracker = StateTracker(snapshot_dir=self.snapshot_dir)
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)
+
+    def test_installed_packages_from_dpkg_status(self, tmp_path):
+        """Test that installed packages are read from the dpkg status file."""
+        status_file = tmp_path / "status"
+        status_file.write_text(
+            "Package: nginx\nStatus: install ok installed\n\n"
+            "Package: sqlite3\nStatus: deinstall ok config-files\n\n"
+            "Package: openssl\nStatus: hold ok installed\n"
+        )
+
+        with patch('core.state_tracker.DPKG_STATUS_FILE', str(status_file)), \
+                patch('core.state_tracker.subprocess.run') as mock_run:
+            packages = ["sqlite3", "nginx", "openssl", "missing"]
+            assert self.tracker._get_installed_packages(packages) == ["nginx", "openssl"]
+
+            with patch('builtins.open', side_effect=AssertionError("status re-read")):
+                assert self.tracker._get_installed_packages(["nginx"]) == ["nginx"]
+
+            status_file.write_text("Package: curl\nStatus: install ok installed\n")
+            assert self.tracker._get_installed_packages(["nginx", "curl"]) == ["curl"]
+
+        mock_run.assert_not_called()
+
+    @patch('core.state_tracker.DPKG_STATUS_FILE', '/nonexistent/dpkg/status')
+    @patch('core.state_tracker.subprocess.run')
+    def test_installed_packages_single_query(self, mock_run):
+        """Test that all packages are checked with one dpkg-query call."""
+        mock_run.return_value = Mock(
+            returncode=1,
+            stdout="nginx\tii \nsqlite3\trc \nopenssl\thi \n"
+        )
+
+        installed = self.tracker._get_installed_packages(
+            ["sqlite3", "nginx", "openssl", "missing"]
+        )
+
+        assert installed == ["nginx", "openssl"]
+        mock_run.assert_called_once()
+        cmd = mock_run.call_args[0][0]
+        assert cmd[:2] == ["dpkg-query", "-W"]
+        assert cmd[3:] == ["sqlite3", "nginx", "openssl", "missing"]
+
+    @patch('core.state_tracker.subprocess.run')
+    def test_service_status_single_show_call(self, mock_run):
+        """Test that service states come from one systemctl show call."""
+        mock_run.return_value = Mock(
+            returncode=0,
+            stdout="ActiveState=active\nUnitFileState=disabled\n\n"
+                   "ActiveState=inactive\nUnitFileState=enabled\n"
+        )
+
+        statuses = self.tracker._get_service_status_batch(["nginx", "cron"])
+
+        assert statuses == {
+            "nginx": {"active": True, "enabled": False},
+            "cron": {"active": False, "enabled": True}
+        }
+        mock_run.assert_called_once()
+        assert mock_run.call_args[0][0][:2] == ["systemctl", "show"]
+        # Spawned via posix_spawn rather than fork+exec
+        assert mock_run.call_args[1]["close_fds"] is False
+
+    def test_file_snapshot_backup_and_restore(self, tmp_path):
+        """Test that a file is backed up with its data and mode and restored."""
+        config = tmp_path / "app.conf"
+        config.write_text("original\n")
+        config.chmod(0o640)
+
+        snapshot = self.tracker.create_snapshot({"type": "file_copy", "dest": str(config)})
+
+        config.write_text("changed\n")
+        assert self.tracker.restore_from_snapshot(snapshot) is True
+        assert config.read_text() == "original\n"
+        assert config.stat().st_mode & 0o777 == 0o640
+
+    @patch('core.state_tracker.subprocess.run')
+    def test_user_snapshot_without_subprocess(self, mock_run):
+        """Test that user lookups go through the passwd database."""
+        snapshot = self.tracker.create_snapshot(
+            {"type": "user_management", "username": "root", "action": "remove"}
+        )
+
+        assert snapshot["exists"] is True
+        assert snapshot["user_info"]["uid"] == 0
+        assert snapshot["user_info"]["home"] == "/root"
+        assert self.tracker._check_user_exists("no-such-user-ti") is False
+        mock_run.assert_not_called()
+
+    def test_file_snapshot_missing_file(self, tmp_path):
+        """Test that a missing destination is recorded without a backup."""
+        snapshot = self.tracker.create_snapshot(
+            {"type": "file_copy", "dest": str(tmp_path / "absent.conf")}
+        )
+
+        assert snapshot["exists"] is False
+        assert "backup_path" not in snapshot
+        assert "error" not in snapshot
@@ -0,0 +1,190 @@
+"""Tests for step executor."""
+
+import threading
+
+import pytest
+from unittest.mock import Mock, patch
+
+from backends.step_executor import StepExecutor, step_runs
+from core.exceptions import StepExecutionError
+
+
+class TestStepExecutor:
+    """Test cases for StepExecutor."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.executor = StepExecutor()
+        self.handlers_patcher = patch.object(self.executor, 'simple_handlers')
+        self.mock_handlers = self.handlers_patcher.start()
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.handlers_patcher.stop()
+
+    def test_execute_steps_coalesces_adjacent_apt_steps(self):
+        """Test that consecutive apt steps share one package transaction."""
+        steps = [
+            {"type": "apt_package", "action": "install", "packages": ["nginx"]},
+            {"type": "apt_package", "action": "install", "packages": ["redis", "curl"]},
+            {"type": "file_copy", "src": "/tmp/a", "dest": "/tmp/b"},
+            {"type": "apt_package", "action": "remove", "packages": ["apache2"]},
+            {"type": "apt_package", "action": "install", "packages": ["git"]}
+        ]
+
+        results = self.executor.execute_steps(steps)
+
+        assert self.mock_handlers.package_transaction.call_count == 2
+        assert [call[0][0] for call in self.mock_handlers.install_packages.call_args_list] == [
+            ["nginx"], ["redis", "curl"], ["git"]
+        ]
+        self.mock_handlers.remove_packages.assert_called_once_with(["apache2"])
+        assert sorted(results) == [0, 1, 2, 3, 4]
+        assert results[1]["packages"] == ["redis", "curl"]
+        assert results[2]["destination"] == "/tmp/b"
+
+    def test_execute_steps_rejects_empty_apt_step(self):
+        """Test that an apt step without packages fails the whole group."""
+        steps = [
+            {"type": "apt_package", "action": "install", "packages": ["nginx"]},
+            {"type": "apt_package", "action": "install", "packages": []}
+        ]
+
+        with pytest.raises(Exception, match="No packages specified"):
+            self.executor.execute_steps(steps)
+
+        self.mock_handlers.install_packages.assert_not_called()
+
+    def test_execute_steps_splits_runs_on_shared_packages(self):
+        """Test that apt steps touching the same package keep their order."""
+        steps = [
+            {"type": "apt_package", "action": "remove", "packages": ["nginx"]},
+            {"type": "apt_package", "action": "install", "packages": ["nginx", "curl"]},
+            {"type": "apt_package", "action": "install", "packages": ["git"]}
+        ]
+
+        assert step_runs(steps) == [[0], [1, 2]]
+
+        self.executor.execute_steps(steps)
+
+        assert self.mock_handlers.package_transaction.call_count == 2
+        self.mock_handlers.remove_packages.assert_called_once_with(["nginx"])
+
+    @patch('backends.simple_handlers.apt', None)
+    @patch('backends.simple_handlers.os.path.getmtime', return_value=0)
+    @patch('backends.simple_handlers.run_command')
+    def test_execute_steps_mixed_apt_actions_single_apt_run(self, mock_run, mock_getmtime):
+        """Test that adjacent install and remove steps end up in one apt-get call."""
+        mock_run.return_value = Mock(stdout="", stderr="")
+        executor = StepExecutor()
+
+        executor.execute_steps([
+            {"type": "apt_package", "action": "install", "packages": ["nginx"]},
+            {"type": "apt_package", "action": "remove", "packages": ["apache2"]}
+        ])
+
+        assert [call[0][0] for call in mock_run.call_args_list] == [
+            ("apt-get", "update"),
+            ("apt-get", "install", "-y", "nginx", "apache2-")
+        ]
+
+    def test_apt_actions_dispatch(self):
+        """Test that each apt action calls its SimpleHandlers method."""
+        result = self.executor.execute_step(
+            {"type": "apt_package", "action": "update", "packages": ["curl"]}
+        )
+
+        self.mock_handlers.update_packages.assert_called_once_with(["curl"])
+        assert result["message"] == "Updated packages: ['curl']"
+
+        with pytest.raises(Exception, match="Unknown apt action: purge"):
+            self.executor.execute_step(
+                {"type": "apt_package", "action": "purge", "packages": ["curl"]}
+            )
+
+    def test_file_copy_uses_handlers(self):
+        """Test that file_copy steps copy through SimpleHandlers."""
+        result = self.executor.execute_step(
+            {"type": "file_copy", "src": "/tmp/app.conf", "dest": "/etc/app/app.conf"}
+        )
+
+        self.mock_handlers.copy_file.assert_called_once_with("/tmp/app.conf", "/etc/app/app.conf")
+        assert result["destination"] == "/etc/app/app.conf"
+
+    def test_custom_script_runs_without_shell(self, tmp_path):
+        """Test that a custom script is executed directly with its arguments."""
+        marker = tmp_path / "ran"
+        script = tmp_path / "setup.sh"
+        script.write_text('#!/bin/sh\necho "$1" > "$2"\n')
+        script.chmod(0o755)
+
+        self.executor.execute_step(
+            {"type": "custom_script", "script": f"{script} 'hello world' {marker}"}
+        )
+
+        assert marker.read_text() == "hello world\n"
+
+    def test_custom_script_failure(self):
+        """Test that a failing script raises StepExecutionError with its stderr."""
+        with pytest.raises(StepExecutionError, match="broken"):
+            self.executor.execute_step(
+                {"type": "custom_script", "script": ["sh", "-c", "echo broken >&2; exit 1"]}
+            )
+
+    def test_execute_dag_runs_independent_steps_concurrently(self):
+        """Test that steps without mutual dependencies overlap."""
+        both_started = threading.Barrier(2, timeout=5)
+        order = []
+
+        def execute_step(step):
+            if step["id"] in ("a", "b"):
+                both_started.wait()
+            order.append(step["id"])
+            return {"success": True}
+
+        steps = [
+            {"id": "a", "type": "file_copy", "depends_on": []},
+            {"id": "b", "type": "file_copy", "depends_on": []},
+            {"id": "c", "type": "file_copy", "depends_on": ["a", "b"]},
+            {"id": "d", "type": "file_copy"}
+        ]
+
+        with patch.object(self.executor, 'execute_step', side_effect=execute_step):
+            results = self.executor.execute_dag(steps)
+
+        assert sorted(results) == [0, 1, 2, 3]
+        assert order[2:] == ["c", "d"]
+
+    def test_execute_dag_stops_after_failure(self):
+        """Test that dependents of a failed step are not started."""
+        finished = []
+
+        def execute_step(step):
+            if step["id"] == "a":
+                raise Exception("boom")
+            return {"success": True}
+
+        steps = [
+            {"id": "a", "type": "file_copy", "depends_on": []},
+            {"id": "b", "type": "file_copy", "depends_on": ["a"]}
+        ]
+
+        with patch.object(self.executor, 'execute_step', side_effect=execute_step):
+            with pytest.raises(Exception, match="boom"):
+                self.executor.execute_dag(
+                    steps, after_step=lambda index, step, error: finished.append((index, error))
+                )
+
+        assert len(finished) == 1
+        assert finished[0][0] == 0
+        assert str(finished[0][1]) == "boom"
+
+    def test_execute_dag_rejects_forward_dependency(self):
+        """Test that depends_on may only reference earlier steps."""
+        steps = [
+            {"id": "a", "type": "file_copy", "depends_on": ["b"]},
+            {"id": "b", "type": "file_copy"}
+        ]
+
+        with pytest.raises(Exception, match="unknown or later step"):
+            self.executor.execute_dag(steps)
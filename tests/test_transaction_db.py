@@ -0,0 +1,126 @@
+"""Tests for transaction database."""
+
+import os
+import sqlite3
+import tempfile
+import threading
+
+import pytest
+
+from storage.transaction_db import TransactionDB
+
+
+class TestTransactionDB:
+    """Test cases for TransactionDB."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "transactions.db")
+        self.db = TransactionDB(self.db_path)
+
+    def teardown_method(self):
+        """Clean up test fixtures."""
+        self.db.close()
+        for name in os.listdir(self.temp_dir):
+            os.unlink(os.path.join(self.temp_dir, name))
+        os.rmdir(self.temp_dir)
+
+    def test_database_uses_wal_journal(self):
+        """Test that the database is switched to write-ahead logging."""
+        with sqlite3.connect(self.db_path) as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_step_lookups_use_index(self):
+        """Test that per-transaction step queries search an index, not the table."""
+        with sqlite3.connect(self.db_path) as conn:
+            plan = conn.execute("""
+                EXPLAIN QUERY PLAN
+                UPDATE steps SET status = 'completed' WHERE transaction_id = 1 AND step_order = 2
+            """).fetchall()
+
+        assert "idx_steps_transaction_order" in plan[0][-1]
+
+    def test_create_and_get_transaction(self):
+        """Test that a transaction round-trips through the database."""
+        transaction_id = self.db.create_transaction("nginx", "abc123", {"package": {"name": "nginx"}})
+
+        transaction = self.db.get_transaction(transaction_id)
+
+        assert transaction["package_name"] == "nginx"
+        assert transaction["metadata"] == {"package": {"name": "nginx"}}
+        assert transaction["status"] == "pending"
+
+    def test_concurrent_writes_share_connection(self):
+        """Test that steps recorded from several threads are all stored."""
+        transaction_id = self.db.create_transaction("nginx", "abc123", {})
+
+        def record(step_order):
+            self.db.record_step(transaction_id, step_order, "file_copy", {"dest": f"/tmp/{step_order}"},
+                                snapshot={"exists": False})
+
+        threads = [threading.Thread(target=record, args=(order,)) for order in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        steps = self.db.get_transaction_steps(transaction_id)
+        assert [step["step_order"] for step in steps] == list(range(1, 9))
+        assert len(self.db.get_transaction_snapshots(transaction_id)) == 8
+
+    def test_transaction_status_counts(self):
+        """Test that the status reports step and snapshot counts."""
+        transaction_id = self.db.create_transaction("nginx", "abc123", {})
+        self.db.record_step(transaction_id, 1, "file_copy", {}, snapshot={"exists": False})
+        self.db.record_step(transaction_id, 2, "file_copy", {})
+
+        status = self.db.get_transaction_status(transaction_id)
+
+        assert status["package_name"] == "nginx"
+        assert status["steps_count"] == 2
+        assert status["snapshots_count"] == 1
+        assert self.db.get_transaction_status(transaction_id + 1) == {"status": "not_found"}
+
+    def test_cleanup_removes_steps_and_snapshots(self):
+        """Test that old finished transactions are deleted with their rows."""
+        old_id = self.db.create_transaction("old", "abc123", {})
+        recent_id = self.db.create_transaction("recent", "def456", {})
+        for transaction_id in (old_id, recent_id):
+            self.db.record_step(transaction_id, 1, "file_copy", {}, snapshot={"exists": False})
+            self.db.commit_transaction(transaction_id)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE transactions SET created_at = datetime('now', '-40 days') WHERE id = ?",
+                (old_id,)
+            )
+
+        assert self.db.cleanup_old_transactions(days=30) == 1
+
+        assert self.db.get_transaction(old_id) is None
+        assert self.db.get_transaction_steps(old_id) == []
+        assert self.db.get_transaction_snapshots(old_id) == []
+        assert len(self.db.get_transaction_steps(recent_id)) == 1
+
+    def test_record_step_is_atomic(self):
+        """Test that a failed step insert leaves no partial writes behind."""
+        transaction_id = self.db.create_transaction("nginx", "abc123", {})
+        self.db.record_step(transaction_id, 1, "file_copy", {})
+
+        with pytest.raises(sqlite3.IntegrityError):
+            self.db.record_step(transaction_id, 2, None, {}, snapshot={"exists": False})
+
+        assert [step["status"] for step in self.db.get_transaction_steps(transaction_id)] == ["pending"]
+        assert self.db.get_transaction_snapshots(transaction_id) == []
+
+        self.db.update_step_status(transaction_id, 1, "completed")
+        assert self.db.get_transaction_steps(transaction_id)[0]["status"] == "completed"
+
+    def test_in_memory_database(self):
+        """Test that an in-memory database keeps its tables across calls."""
+        db = TransactionDB(":memory:")
+        transaction_id = db.create_transaction("nginx", "abc123", {})
+
+        assert db.get_transaction(transaction_id)["package_name"] == "nginx"
+        assert [tx["id"] for tx in db.list_transactions()] == [transaction_id]
+        db.close()
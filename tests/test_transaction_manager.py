@@ -1,8 +1,8 @@
 """Tests for transaction manager."""
 
 import pytest
-import tempfile
-import os
+import shutil
+import threading
 from unittest.mock import Mock, patch
 
 from core.transaction_manager import TransactionManager
@@ -14,11 +14,10 @@ class TestTransactionManager:
 
     def setup_method(self):
         """Set up test fixtures."""
-        # Create temporary database file
-        self.temp_db = tempfile.NamedTemporaryFile(delete=False)
-        self.temp_db.close()
+        # The database only needs to live as long as the test
+        self.db_path = ":memory:"
         
-        self.manager = TransactionManager(db_path=self.temp_db.name)
+        self.manager = TransactionManager(db_path=self.db_path)
         
         self.test_metadata = {
             "package": {
@@ -36,8 +35,7 @@ class TestTransactionManager:
 
     def teardown_method(self):
         """Clean up test fixtures."""
-        if os.path.exists(self.temp_db.name):
-            os.unlink(self.temp_db.name)
+        shutil.rmtree(self.manager.state_tracker.snapshot_dir, ignore_errors=True)
 
     def test_begin_transaction(self):
         """Test beginning a transaction."""
@@ -63,11 +61,11 @@ class TestTransactionManager:
         """Test successful step execution."""
         # Mock step executor
         mock_executor = Mock()
-        mock_executor.execute_step.return_value = {"success": True}
+        mock_executor.execute_steps.return_value = {0: {"success": True}}
         mock_step_executor.return_value = mock_executor
         
         # Recreate manager with mocked step executor
-        self.manager = TransactionManager(db_path=self.temp_db.name)
+        self.manager = TransactionManager(db_path=self.db_path)
         
         # Begin transaction
         transaction_id = self.manager.begin_transaction(
@@ -87,18 +85,195 @@ class TestTransactionManager:
         self.manager.execute_steps(steps)
         
         # Verify step was executed
-        mock_executor.execute_step.assert_called_once()
+        mock_executor.execute_steps.assert_called_once_with(steps)
+        
+        # Verify step and snapshot were recorded
+        status = self.manager.get_transaction_status(transaction_id)
+        assert status["steps_count"] == 1
+        assert status["snapshots_count"] == 1
+
+    @patch('core.transaction_manager.StepExecutor')
+    def test_execute_steps_persists_completion_before_next_step(self, mock_step_executor):
+        """Test that a step is recorded completed before the next one runs."""
+        mock_executor = Mock()
+        mock_step_executor.return_value = mock_executor
+
+        self.manager = TransactionManager(db_path=self.db_path)
+        transaction_id = self.manager.begin_transaction(
+            package_name="test-package",
+            metadata=self.test_metadata
+        )
+        steps = [
+            {"type": "file_copy", "src": "/tmp/a.conf", "dest": "/tmp/b.conf"},
+            {"type": "custom_script", "script": "setup.sh"}
+        ]
+        statuses_seen = []
+
+        def execute_steps(run):
+            recorded = self.manager.db.get_transaction_steps(transaction_id)
+            statuses_seen.append([recorded_step["status"] for recorded_step in recorded])
+            return {0: {"success": True}}
+        mock_executor.execute_steps.side_effect = execute_steps
+
+        with patch.object(self.manager.state_tracker, 'create_snapshot',
+                          return_value={"type": "file", "exists": False}):
+            self.manager.execute_steps(steps)
+
+        assert statuses_seen == [["pending"], ["completed", "pending"]]
+        recorded = self.manager.db.get_transaction_steps(transaction_id)
+        assert [step["status"] for step in recorded] == ["completed", "completed"]
+
+    @patch('core.transaction_manager.StepExecutor')
+    def test_execute_steps_skips_noop_apt_step(self, mock_step_executor):
+        """Test that installing already installed packages is skipped."""
+        mock_executor = Mock()
+        mock_step_executor.return_value = mock_executor
+
+        self.manager = TransactionManager(db_path=self.db_path)
+        transaction_id = self.manager.begin_transaction(
+            package_name="test-package",
+            metadata=self.test_metadata
+        )
+        steps = [
+            {"type": "apt_package", "action": "install", "packages": ["nginx"]},
+            {"type": "apt_package", "action": "install", "packages": ["curl"]}
+        ]
+
+        def create_snapshot(step):
+            installed = [p for p in step["packages"] if p == "nginx"]
+            return {"type": "package", "already_installed": installed}
+
+        with patch.object(self.manager.state_tracker, 'create_snapshot',
+                          side_effect=create_snapshot):
+            self.manager.execute_steps(steps)
+
+        mock_executor.execute_steps.assert_called_once_with([steps[1]])
+        recorded = self.manager.db.get_transaction_steps(transaction_id)
+        assert [step["status"] for step in recorded] == ["skipped", "completed"]
+
+    @patch('core.transaction_manager.StepExecutor')
+    def test_execute_steps_coalesces_consecutive_apt_steps(self, mock_step_executor):
+        """Test that consecutive apt steps run together but are recorded one by one."""
+        mock_executor = Mock()
+        mock_step_executor.return_value = mock_executor
+
+        self.manager = TransactionManager(db_path=self.db_path)
+        transaction_id = self.manager.begin_transaction(
+            package_name="test-package",
+            metadata=self.test_metadata
+        )
+        steps = [
+            {"type": "apt_package", "action": "install", "packages": ["nginx"]},
+            {"type": "apt_package", "action": "remove", "packages": ["apache2"]},
+            {"type": "file_copy", "src": "/tmp/a.conf", "dest": "/tmp/b.conf"},
+            {"type": "apt_package", "action": "install", "packages": ["curl"]}
+        ]
+
+        with patch.object(self.manager.state_tracker, 'create_snapshot',
+                          return_value={"type": "package", "already_installed": []}):
+            self.manager.execute_steps(steps)
+
+        assert [call[0][0] for call in mock_executor.execute_steps.call_args_list] == [
+            steps[:2], [steps[2]], [steps[3]]
+        ]
+        recorded = self.manager.db.get_transaction_steps(transaction_id)
+        assert [step["status"] for step in recorded] == ["completed"] * 4
+        assert len(self.manager.db.get_transaction_snapshots(transaction_id)) == 4
+
+    def _execute_against_installed(self, mock_step_executor, steps, installed):
+        """Execute steps with snapshots and apt runs tracking an installed set."""
+        def snapshot(step):
+            present = [pkg for pkg in step["packages"] if pkg in installed]
+            return {"type": "package", "already_installed": present, "to_remove": present}
+
+        def apply(run):
+            for step in run:
+                if step["action"] == "install":
+                    installed.update(step["packages"])
+                else:
+                    installed.difference_update(step["packages"])
+
+        mock_executor = Mock()
+        mock_executor.execute_steps.side_effect = apply
+        mock_step_executor.return_value = mock_executor
+
+        self.manager = TransactionManager(db_path=self.db_path)
+        transaction_id = self.manager.begin_transaction(
+            package_name="test-package",
+            metadata=self.test_metadata
+        )
+        with patch.object(self.manager.state_tracker, 'create_snapshot', side_effect=snapshot):
+            self.manager.execute_steps(steps)
+
+        assert [call[0][0] for call in mock_executor.execute_steps.call_args_list] == [
+            [steps[0]], [steps[1]]
+        ]
+        recorded = self.manager.db.get_transaction_steps(transaction_id)
+        assert [step["status"] for step in recorded] == ["completed", "completed"]
+
+    @patch('core.transaction_manager.StepExecutor')
+    def test_execute_steps_remove_then_install_same_package(self, mock_step_executor):
+        """Test that reinstalling a removed package is not skipped as a no-op."""
+        installed = {"nginx"}
+        steps = [
+            {"type": "apt_package", "action": "remove", "packages": ["nginx"]},
+            {"type": "apt_package", "action": "install", "packages": ["nginx"]}
+        ]
+
+        self._execute_against_installed(mock_step_executor, steps, installed)
+
+        assert installed == {"nginx"}
+
+    @patch('core.transaction_manager.StepExecutor')
+    def test_execute_steps_install_then_remove_same_package(self, mock_step_executor):
+        """Test that removing a freshly installed package is not skipped as a no-op."""
+        installed = set()
+        steps = [
+            {"type": "apt_package", "action": "install", "packages": ["nginx"]},
+            {"type": "apt_package", "action": "remove", "packages": ["nginx"]}
+        ]
+
+        self._execute_against_installed(mock_step_executor, steps, installed)
+
+        assert installed == set()
+
+    @patch('core.transaction_manager.StepExecutor')
+    def test_execute_steps_failed_apt_run_marks_its_steps_failed(self, mock_step_executor):
+        """Test that every step of a failed apt run is recorded as failed."""
+        mock_executor = Mock()
+        mock_executor.execute_steps.side_effect = Exception("apt failed")
+        mock_step_executor.return_value = mock_executor
+
+        self.manager = TransactionManager(db_path=self.db_path)
+        transaction_id = self.manager.begin_transaction(
+            package_name="test-package",
+            metadata=self.test_metadata
+        )
+        steps = [
+            {"type": "apt_package", "action": "install", "packages": ["nginx"]},
+            {"type": "apt_package", "action": "install", "packages": ["curl"]}
+        ]
+
+        with patch.object(self.manager.state_tracker, 'create_snapshot',
+                          return_value={"type": "package", "already_installed": []}), \
+                patch.object(self.manager, 'rollback_transaction') as mock_rollback:
+            with pytest.raises(TransactionError, match="Step 1, 2 failed"):
+                self.manager.execute_steps(steps)
+
+        mock_rollback.assert_called_once()
+        recorded = self.manager.db.get_transaction_steps(transaction_id)
+        assert [step["status"] for step in recorded] == ["failed", "failed"]
 
     @patch('core.transaction_manager.StepExecutor')
     def test_execute_steps_failure(self, mock_step_executor):
         """Test step execution failure with rollback."""
         # Mock step executor to fail
         mock_executor = Mock()
-        mock_executor.execute_step.side_effect = Exception("Step failed")
+        mock_executor.execute_steps.side_effect = Exception("Step failed")
         mock_step_executor.return_value = mock_executor
         
         # Recreate manager with mocked step executor
-        self.manager = TransactionManager(db_path=self.temp_db.name)
+        self.manager = TransactionManager(db_path=self.db_path)
         
         # Begin transaction
         transaction_id = self.manager.begin_transaction(
@@ -118,6 +293,62 @@ class TestTransactionManager:
         with pytest.raises(TransactionError):
             self.manager.execute_steps(steps)
 
+    @patch('core.transaction_manager.StepExecutor')
+    def test_execute_steps_with_dependencies(self, mock_step_executor):
+        """Test that steps declaring dependencies are run as a graph."""
+        mock_executor = Mock()
+
+        def execute_dag(steps, before_step, after_step):
+            for index, step in enumerate(steps):
+                before_step(index, step)
+                after_step(index, step, None)
+            return {}
+        mock_executor.execute_dag.side_effect = execute_dag
+        mock_step_executor.return_value = mock_executor
+
+        self.manager = TransactionManager(db_path=self.db_path)
+        transaction_id = self.manager.begin_transaction(
+            package_name="test-package",
+            metadata=self.test_metadata
+        )
+
+        steps = [
+            {"id": "pkg", "type": "apt_package", "action": "install", "packages": ["nginx"]},
+            {"type": "apt_package", "action": "install", "packages": ["curl"],
+             "depends_on": []}
+        ]
+        self.manager.execute_steps(steps)
+
+        mock_executor.execute_step.assert_not_called()
+        recorded = self.manager.db.get_transaction_steps(transaction_id)
+        assert [step["status"] for step in recorded] == ["completed", "completed"]
+
+    def test_independent_step_snapshots_taken_concurrently(self):
+        """Test that snapshots of independent graph steps overlap."""
+        both_snapshotting = threading.Barrier(2, timeout=5)
+
+        def create_snapshot(step):
+            both_snapshotting.wait()
+            return {"type": "minimal"}
+
+        transaction_id = self.manager.begin_transaction(
+            package_name="test-package",
+            metadata=self.test_metadata
+        )
+        steps = [
+            {"id": "a", "type": "file_copy", "depends_on": []},
+            {"id": "b", "type": "file_copy", "depends_on": []}
+        ]
+
+        with patch.object(self.manager.state_tracker, 'create_snapshot',
+                          side_effect=create_snapshot), \
+                patch.object(self.manager.step_executor, 'execute_step',
+                             return_value={"success": True}):
+            self.manager.execute_steps(steps)
+
+        status = self.manager.get_transaction_status(transaction_id)
+        assert status["snapshots_count"] == 2
+
     def test_commit_transaction(self):
         """Test committing a transaction."""
         # Begin transaction
@@ -210,4 +441,15 @@ class TestTransactionManager:
         
         # Verify transaction still exists
         status = self.manager.get_transaction_status(transaction_id)
-        assert status["status"] == "completed" 
\ No newline at end of file
+        assert status["status"] == "completed" 
+
+    def test_iter_transactions(self):
+        """Test that transactions can be streamed instead of listed."""
+        for name in ("first-package", "second-package"):
+            self.manager.begin_transaction(package_name=name, metadata=self.test_metadata)
+
+        transactions = self.manager.iter_transactions(limit=1)
+
+        assert next(transactions)["package_name"] in ("first-package", "second-package")
+        assert next(transactions, None) is None
+        assert len(self.manager.list_transactions(limit=10)) == 2